@@ -0,0 +1,48 @@
+"""
+Times the chunk header of DMD.load_bmp() built with the old bit strings and
+with struct, and the whole chunk command built both ways.
+
+Run with python bench_packets.py [number of chunks]. No DMD has to be
+connected.
+"""
+import struct
+import sys
+import timeit
+
+from test_packets import old_reports
+from pycrafter6500 import (bits_to_bytes, command_packet,
+                           convert_num_to_bit_string)
+
+
+def old_header(length):
+    return bits_to_bytes(convert_num_to_bit_string(length, 16))
+
+
+def new_header(length):
+    return struct.pack('<H', length)
+
+
+def main(number=10000):
+    chunk = bytes(range(256)) * 2
+    chunk = chunk[:504]
+    old_chunk = list(chunk)
+
+    timings = [
+        ('chunk header, bit strings',
+         lambda: old_header(504)),
+        ('chunk header, struct',
+         lambda: new_header(504)),
+        ('chunk command, bit strings',
+         lambda: old_reports('w', 0x11, 0x1a, 0x2b,
+                             old_header(504) + old_chunk)),
+        ('chunk command, struct',
+         lambda: command_packet('w', 0x11, 0x1a, 0x2b,
+                                new_header(504) + chunk)),
+    ]
+    for name, function in timings:
+        seconds = min(timeit.repeat(function, number=number, repeat=5))
+        print('%-28s %8.2f us per chunk' % (name, 1e6 * seconds / number))
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
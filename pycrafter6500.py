@@ -32,6 +32,16 @@ import tkinter.ttk as ttk
 from tkinter import filedialog
 import matplotlib.pyplot as plt
 import datetime
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import mmap
+import queue
+import struct
+import threading
+import types
 
 def convert_num_to_bit_string(number, length):
     """
@@ -85,229 +95,3315 @@ def bits_to_bytes(bit_string):
     return byte_list
 
 
-def merge_images(images):
+class FramePool():
     """
-    Creates a 3D numpy array out of the 2D numpy array representing a image.
+    Pool of reusable image buffers.
+
+    Merging allocates a 6 MB frame and some scratch planes per image. The
+    pool hands out buffers that were given back before instead, so that a
+    long sequence does not allocate a new frame for every image.
+
+    Attributes
+    ----------
+    max_free : int
+        Number of free buffers kept per shape.
+
+    Methods
+    -------
+    take()
+        Returns a buffer of the given shape.
+    give()
+        Gives a buffer back to the pool.
+    clear()
+        Drops all free buffers.
+    """
+
+    def __init__(self, max_free=4):
+        """
+        FramePool class constructor.
+
+        Parameters
+        ----------
+        max_free : int, optional
+            Number of free buffers kept per shape. The default is 4.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.max_free = max_free
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def take(self, shape):
+        """
+        Returns a buffer of the given shape.
+
+        Parameters
+        ----------
+        shape : tuple
+            Shape of the buffer.
+
+        Returns
+        -------
+        buffer : numpy array
+            uint8 array, its content is undefined.
+
+        """
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                return free.pop()
+
+        return numpy.empty(shape, dtype=numpy.uint8)
+
+    def give(self, buffer):
+        """
+        Gives a buffer back to the pool. It must not be used afterwards.
+
+        Parameters
+        ----------
+        buffer : numpy array
+            uint8 array taken from the pool.
+
+        Returns
+        -------
+        None.
+
+        """
+        if buffer.dtype != numpy.uint8 or not buffer.flags.c_contiguous:
+            return
+
+        with self._lock:
+            free = self._free.setdefault(buffer.shape, [])
+            if len(free) < self.max_free:
+                free.append(buffer)
+
+    def clear(self):
+        """
+        Drops all free buffers.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self._lock:
+            self._free = {}
+
+
+# buffers of merge_images(), every process has its own pool
+FRAME_POOL = FramePool()
+
+
+def merge_images(images, out=None, pool=None):
+    """
+    Creates a 24 bit image out of up to 24 binary bit planes.
+
+    Planes 0 to 7 are the bits of the blue channel (index 2), planes 8 to
+    15 of the green channel and planes 16 to 23 of the red channel (index
+    0). The planes are packed with shifts and ORs into scratch planes taken
+    from a pool, so no full size temporaries are created for planes of
+    type uint8 or bool.
+
+    Parameters
+    ----------
+    images : list of numpy array 2D or numpy array 3D
+        The bit planes, each holding only 0 and 1, of shape (1080, 1920).
+    out : numpy array 3D, optional
+        uint8 array of shape (1080, 1920, 3) the image is written to. If
+        None, a buffer is taken from the pool. The default is None.
+    pool : FramePool, optional
+        Pool the buffers are taken from. If None, FRAME_POOL is used. The
+        default is None.
+
+    Raises
+    ------
+    ValueError
+        If there are more than 24 planes or a plane is not binary.
+
+    Returns
+    -------
+    merged_image : numpy array 3D
+        A 3D numpy array with bit depth of 8 representing a image. Give it
+        back to the pool once it is no longer needed.
+
+    """
+    if pool is None:
+        pool = FRAME_POOL
+    if len(images) > 24:
+        raise ValueError('Up to 24 bit planes can be merged, got %d.'
+                         % len(images))
+
+    shape = numpy.shape(images[0]) if len(images) else (1080, 1920)
+    if out is None:
+        out = pool.take(shape + (3,))
+
+    # binary planes do not carry into the next byte when shifted by up to
+    # 7 bits, so 8 pixels are shifted and ORed at once as one 64 bit word
+    size = int(numpy.prod(shape))
+    word = numpy.uint64 if size % 8 == 0 else numpy.uint8
+    high = word(0xfefefefefefefefe) if word is numpy.uint64 else word(0xfe)
+
+    channel = pool.take(shape)
+    shifted = pool.take(shape)
+    seen = pool.take(shape)
+    channel_words = channel.reshape(-1).view(word)
+    shifted_words = shifted.reshape(-1).view(word)
+    seen_words = seen.reshape(-1).view(word)
+    try:
+        for byte in range(3):
+            channel.fill(0)
+            seen.fill(0)
+            planes = images[byte * 8:(byte + 1) * 8]
+            for bit, plane in enumerate(planes):
+                plane = _plane_bytes(plane, byte * 8 + bit)
+                plane_words = plane.reshape(-1).view(word)
+                numpy.bitwise_or(seen_words, plane_words, out=seen_words)
+                numpy.left_shift(plane_words, bit, out=shifted_words)
+                numpy.bitwise_or(channel_words, shifted_words,
+                                 out=channel_words)
+
+            # a pixel above 1 in any of the planes sets one of the high bits
+            numpy.bitwise_and(seen_words, high, out=shifted_words)
+            if shifted_words.any():
+                for bit, plane in enumerate(planes):
+                    if _plane_bytes(plane, byte * 8 + bit).max() > 1:
+                        raise ValueError('Bit plane %d is not binary, it has '
+                                         'to hold 0 and 1 only.'
+                                         % (byte * 8 + bit))
+
+            out[:, :, 2 - byte] = channel
+    finally:
+        pool.give(channel)
+        pool.give(shifted)
+        pool.give(seen)
+
+    return out
+
+
+def _plane_bytes(plane, index):
+    """
+    Returns a bit plane as a contiguous uint8 array, without copying it if
+    it already is one.
+    """
+    plane = numpy.asarray(plane)
+    if plane.dtype == bool:
+        plane = plane.view(numpy.uint8)
+    elif plane.dtype != numpy.uint8:
+        if plane.size and (plane.max() > 1 or plane.min() < 0):
+            raise ValueError('Bit plane %d is not binary, it has to hold 0 '
+                             'and 1 only.' % index)
+        plane = plane.astype(numpy.uint8)
+
+    return numpy.ascontiguousarray(plane)
+
+
+def merge_greyscale_images(images, out=None, pool=None):
+    """
+    Creates a 24 bit image out of up to three 8 bit greyscale images.
+
+    Every greyscale image takes one byte of the frame: the first one the
+    blue channel (bits 0-7), the second one the green channel (bits 8-15)
+    and the third one the red channel (bits 16-23), the same bytes
+    merge_images() fills with the planes 0-7, 8-15 and 16-23. For 8 bit
+    patterns these are the bit positions 0, 1 and 2.
 
     Parameters
     ----------
-    images : numpy array 2D
-        A 2D numpy array with bit depth of 8 representing a image.
+    images : list of numpy array 2D
+        Up to three greyscale images of shape (1080, 1920), bit depth 8.
+    out : numpy array 3D, optional
+        uint8 array of shape (1080, 1920, 3) the image is written to. If
+        None, a buffer is taken from the pool. The default is None.
+    pool : FramePool, optional
+        Pool the buffer is taken from. If None, FRAME_POOL is used. The
+        default is None.
+
+    Raises
+    ------
+    ValueError
+        If there are more than three images or an image does not fit in 8
+        bits.
 
     Returns
     -------
     merged_image : numpy array 3D
-        A 3D numpy array with bit depth of 8 representing a image.
+        A 3D numpy array with bit depth of 8 representing a image. Give it
+        back to the pool once it is no longer needed.
 
     """
-    merged_image = numpy.zeros((1080, 1920, 3), dtype='uint8')
+    if pool is None:
+        pool = FRAME_POOL
+    if len(images) > 3:
+        raise ValueError('Up to 3 greyscale images fit in a frame, got %d.'
+                         % len(images))
+
+    shape = numpy.shape(images[0]) if len(images) else (1080, 1920)
+    if out is None:
+        out = pool.take(shape + (3,))
+
+    for byte in range(3):
+        if byte < len(images):
+            image = numpy.asarray(images[byte])
+            if image.dtype != numpy.uint8 and (image.max() > 255
+                                               or image.min() < 0):
+                raise ValueError('Greyscale image %d does not fit in 8 bits.'
+                                 % byte)
+            out[:, :, 2 - byte] = image
+        else:
+            out[:, :, 2 - byte] = 0
+
+    return out
+
+
+def greyscale_frames(images):
+    """
+    Groups 8 bit greyscale images three by three into frames.
+
+    Parameters
+    ----------
+    images : list of numpy array 2D
+        The greyscale images, in display order.
 
-    for i in range(len(images)):
-        if i < 8:
-            merged_image[:, :, 2] = merged_image[:, :, 2] + images[i] * (
-                        2 ** i)
-        if i > 7 and i < 16:
-            merged_image[:, :, 1] = merged_image[:, :, 1] + images[i] * (
-                        2 ** (i - 8))
-        if i > 15 and i < 24:
-            merged_image[:, :, 0] = merged_image[:, :, 0] + images[i] * (
-                        2 ** (i - 16))
+    Returns
+    -------
+    frames : list
+        One entry per frame, each being the images passed to
+        merge_greyscale_images().
+    positions : list of tuple
+        Per image the index of its frame and its bit position in the
+        frame, as passed to DMD.define_pattern() as pat_ind and bit_pos.
+        The bit position counts 8 bit patterns, not bits.
+
+    """
+    frames = [images[i:i + 3] for i in range(0, len(images), 3)]
+    positions = [(i // 3, i % 3) for i in range(len(images))]
 
-    return merged_image
+    return frames, positions
 
 
-def encode(image):
+def deduplicate_images(images, bit_depths=None):
     """
-    Encode a image into a bit string.
+    Finds the images of a sequence that are shown more than once, by a hash
+    of their content, so that every distinct image is only put in a frame
+    and uploaded once.
 
     Parameters
     ----------
-    image : numpy array
-        Image represented as an numpy array. Bit depth is 8.
+    images : list of numpy array 2D
+        The images, in display order.
+    bit_depths : list of int, optional
+        Bit depth of every image. Equal images of different bit depth are
+        kept apart. The default is None.
 
     Returns
     -------
-    bit_string : str
-        Is the encoded image represented as bits.
-    byte_count : int
-        Is the number of bytes from the bit string.
+    first : list of int
+        Index of the first occurrence of every distinct image.
+    index : list of int
+        Per image the index of its distinct image in first.
+
+    """
+    keys = {}
+    first = []
+    index = []
+
+    for position, image in enumerate(images):
+        image = numpy.ascontiguousarray(image)
+        bit_depth = None if bit_depths is None else int(bit_depths[position])
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(('%s;%s;%s;' % (image.shape, image.dtype.str,
+                                      bit_depth)).encode())
+        digest.update(image.data)
+        key = digest.digest()
+
+        if key not in keys:
+            keys[key] = len(first)
+            first.append(position)
+        index.append(keys[key])
+
+    return first, index
+
+
+def brightness_segments(brightness):
+    """
+    Splits a sequence into segments of images shown with the same LED
+    brightness.
+
+    The brightness is not part of the look up table, so the controller can
+    only step through the images of one brightness on its own. Consecutive
+    images of the same brightness share a segment, which gives the fewest
+    segments that keep the display order.
+
+    Parameters
+    ----------
+    brightness : list of int
+        LED PWM value of every image.
+
+    Returns
+    -------
+    segments : list of tuple
+        The (start, stop) image indices of every segment.
+
+    """
+    segments = []
+    start = 0
+    for index in range(1, len(brightness) + 1):
+        if index == len(brightness) or brightness[index] != brightness[start]:
+            segments.append((start, index))
+            start = index
+
+    return segments
+
+
+# bit depths a pattern can have, and the number of bits between two of its
+# bits taken by a pattern of each bit depth, they count the bit positions;
+# the 7 bit patterns take a byte like the 8 bit ones and sit in its upper 7
+# bits, as the bit position table of the DLPC900 programmer's guide lists
+# them (G7-G1, R7-R1, B7-B1)
+PATTERN_BIT_DEPTHS = {1: 1, 2: 2, 4: 4, 6: 6, 7: 8, 8: 8}
+
+
+def _free_bit_position(used, bit_depth):
+    """
+    Returns the first bit position of a frame a pattern fits in, together
+    with the bits it takes, or None if the frame is full for it.
+    """
+    stride = PATTERN_BIT_DEPTHS[bit_depth]
+    mask = ((1 << bit_depth) - 1) << (stride - bit_depth)
+    for bit_pos in range(24 // stride):
+        bits = mask << (stride * bit_pos)
+        if not used & bits:
+            return bit_pos, bits
+
+    return None
+
+
+def pack_patterns(images, bit_depths, keep_order=False):
+    """
+    Packs patterns of mixed bit depth into as few 24 bit frames as possible.
+
+    A pattern of bit depth n takes n consecutive bits of a frame, starting
+    at a multiple of n (the upper 7 bits of a byte for 7 bit patterns),
+    which is how the DLPC900 addresses it by its bit position. The
+    deepest patterns are placed first, each one in the first frame it
+    still fits in, and the 1 bit patterns fill the gaps that are left.
+
+    Parameters
+    ----------
+    images : list of numpy array 2D
+        The patterns, in display order. A pattern of bit depth n holds
+        values from 0 to 2**n - 1.
+    bit_depths : list of int
+        Bit depth of every pattern, 1, 2, 4, 6, 7 or 8.
+    keep_order : bool, optional
+        Fill the frames in display order, a new frame is only started when
+        the next pattern does not fit in the last one. This needs more
+        frames, but a sequence shown pattern by pattern never has to go
+        back to a frame uploaded before. The default is False.
+
+    Raises
+    ------
+    ValueError
+        If a bit depth is not supported or the lists differ in length.
+
+    Returns
+    -------
+    frames : list
+        One entry per frame, each being the (image, bit depth, first bit)
+        tuples passed to merge_patterns().
+    positions : list of tuple
+        Per pattern the index of its frame and its bit position in the
+        frame, as passed to DMD.define_pattern() as pat_ind and bit_pos.
+
+    """
+    bit_depths = [int(bit_depth) for bit_depth in bit_depths]
+    if len(bit_depths) != len(images):
+        raise ValueError('Got %d bit depths for %d patterns.'
+                         % (len(bit_depths), len(images)))
+    for index, bit_depth in enumerate(bit_depths):
+        if bit_depth not in PATTERN_BIT_DEPTHS:
+            raise ValueError('Bit depth %d of pattern %d is not supported, '
+                             'use one of 1, 2, 4, 6, 7 or 8.'
+                             % (bit_depth, index))
+
+    order = range(len(images))
+    if not keep_order:
+        order = sorted(order, key=lambda index: (
+            -PATTERN_BIT_DEPTHS[bit_depths[index]], -bit_depths[index]))
+
+    frames = []
+    positions = [None] * len(images)
+    used = []
+
+    for index in order:
+        bit_depth = bit_depths[index]
+        first = len(used) - 1 if keep_order and used else 0
+        for frame in range(first, len(used)):
+            free = _free_bit_position(used[frame], bit_depth)
+            if free is not None:
+                break
+        else:
+            frame = len(used)
+            frames.append([])
+            used.append(0)
+            free = _free_bit_position(0, bit_depth)
+
+        bit_pos, bits = free
+        used[frame] |= bits
+        frames[frame].append((images[index], bit_depth,
+                              PATTERN_BIT_DEPTHS[bit_depth] * bit_pos))
+        positions[index] = (frame, bit_pos)
+
+    return frames, positions
+
+
+def merge_patterns(patterns, out=None, pool=None):
+    """
+    Creates a 24 bit image out of patterns of mixed bit depth.
+
+    A pattern with fewer bits than it takes in the frame (7 bit patterns
+    take a byte, see PATTERN_BIT_DEPTHS) is put in the upper bits.
+
+    Parameters
+    ----------
+    patterns : list of tuple
+        The (image, bit depth, first bit) of every pattern of the frame, as
+        returned by pack_patterns().
+    out : numpy array 3D, optional
+        uint8 array of shape (1080, 1920, 3) the image is written to. If
+        None, a buffer is taken from the pool. The default is None.
+    pool : FramePool, optional
+        Pool the buffer is taken from. If None, FRAME_POOL is used. The
+        default is None.
+
+    Raises
+    ------
+    ValueError
+        If a pattern does not fit in its bit depth or two patterns share
+        bits.
+
+    Returns
+    -------
+    merged_image : numpy array 3D
+        A 3D numpy array with bit depth of 8 representing a image. Give it
+        back to the pool once it is no longer needed.
+
+    """
+    if pool is None:
+        pool = FRAME_POOL
+
+    shape = numpy.shape(patterns[0][0]) if len(patterns) else (1080, 1920)
+    if out is None:
+        out = pool.take(shape + (3,))
+
+    word = numpy.zeros(shape, dtype=numpy.uint32)
+    used = 0
+
+    for index, (image, bit_depth, first_bit) in enumerate(patterns):
+        shift = first_bit + PATTERN_BIT_DEPTHS.get(bit_depth, bit_depth) \
+            - bit_depth
+        bits = ((1 << bit_depth) - 1) << shift
+        if used & bits or bits >> 24:
+            raise ValueError('Pattern %d does not fit at bit %d of the frame.'
+                             % (index, first_bit))
+        used |= bits
+
+        image = numpy.asarray(image)
+        if image.size and (image.min() < 0 or image.max() >> bit_depth):
+            raise ValueError('Pattern %d does not fit in %d bits.'
+                             % (index, bit_depth))
+        word |= image.astype(numpy.uint32) << shift
+
+    out[:, :, 2] = word & 0xff
+    out[:, :, 1] = (word >> 8) & 0xff
+    out[:, :, 0] = word >> 16
+
+    return out
+
+
+# number of set bits of every byte value
+_BIT_COUNTS = numpy.unpackbits(numpy.arange(256, dtype=numpy.uint8)[:, None],
+                               axis=1).sum(axis=1, dtype=numpy.intp)
+
+
+def plane_signatures(planes, step=64):
+    """
+    Cheap signatures of where bit planes break the runs of a frame.
+
+    A run of the encoded frame ends where any of its planes changes from
+    one pixel to the next, and a row can only be copied from the one above
+    when none of its planes changes between the two. The signature marks
+    these changes on every step-th row, one bit for 8 pixels, so the planes
+    of a frame break few runs when their signatures are alike.
+
+    Parameters
+    ----------
+    planes : list of numpy array 2D
+        Bit planes holding 0 and 1.
+    step : int, optional
+        Distance of the sampled rows. The default is 64.
+
+    Returns
+    -------
+    signatures : numpy array 2D
+        uint8 array with the packed bits of one signature per row.
+
+    """
+    signatures = []
+    for index, plane in enumerate(planes):
+        plane = _plane_bytes(plane, index)
+        rows = plane[step::step]
+        above = plane[step - 1::step][:len(rows)]
+        changes = numpy.concatenate(((rows[:, 1:] != rows[:, :-1]).ravel(),
+                                     (rows != above).ravel()))
+        signatures.append(numpy.packbits(numpy.packbits(changes) != 0))
+
+    return numpy.array(signatures, dtype=numpy.uint8).reshape(len(planes), -1)
+
+
+def grouping_cost(planes, positions, step=64):
+    """
+    Estimates how many runs the frames of a grouping of bit planes have.
+
+    Parameters
+    ----------
+    planes : list of numpy array 2D
+        Bit planes holding 0 and 1.
+    positions : list of tuple
+        Per plane the index of its frame and its bit position, as returned
+        by group_bit_planes().
+    step : int, optional
+        Distance of the sampled rows, as for plane_signatures(). The
+        default is 64.
+
+    Returns
+    -------
+    cost : int
+        Number of run breaks on the sampled rows of all frames.
+
+    """
+    signatures = plane_signatures(planes, step)
+    frames = max(frame for frame, bit_pos in positions) + 1 if planes else 0
+    union = numpy.zeros((frames, signatures.shape[1]), dtype=numpy.uint8)
+    for index, (frame, bit_pos) in enumerate(positions):
+        union[frame] |= signatures[index]
+
+    return int(_BIT_COUNTS[union].sum())
+
+
+def group_bit_planes(planes, step=64):
+    """
+    Groups bit planes by similarity into frames of 24, so that the frames
+    compress better than with the planes taken in display order.
+
+    Every frame starts with the first plane not grouped yet and is then
+    filled, one plane at a time, with the plane adding the fewest run
+    breaks to it (see plane_signatures()). Planes that are alike, or
+    inverted, end up in the same frame. The display order is kept by the
+    look up table, which points every pattern at its frame and bit.
+
+    Parameters
+    ----------
+    planes : list of numpy array 2D
+        Bit planes holding 0 and 1, in display order.
+    step : int, optional
+        Distance of the sampled rows, as for plane_signatures(). The
+        default is 64.
+
+    Returns
+    -------
+    frames : list
+        One entry per frame, each being the bit planes passed to
+        merge_images().
+    positions : list of tuple
+        Per plane the index of its frame and its bit position in the
+        frame, as passed to DMD.define_pattern() as pat_ind and bit_pos.
+
+    """
+    signatures = plane_signatures(planes, step)
+    remaining = list(range(len(planes)))
+    frames = []
+    positions = [None] * len(planes)
+
+    while remaining:
+        members = [remaining.pop(0)]
+        union = signatures[members[0]].copy()
+
+        while len(members) < 24 and remaining:
+            added = _BIT_COUNTS[signatures[remaining] & ~union].sum(axis=1)
+            best = remaining.pop(int(numpy.argmin(added)))
+            union |= signatures[best]
+            members.append(best)
+
+        # keep the display order inside the frame, the bits of a pixel do
+        # not change its runs
+        members.sort()
+        for bit_pos, index in enumerate(members):
+            positions[index] = (len(frames), bit_pos)
+        frames.append([planes[index] for index in members])
+
+    return frames, positions
+
+
+def split_bit_planes(image, bit_depth=8):
+    """
+    Splits a greyscale image into its bit planes, the inverse of
+    merge_images() for a single channel.
+
+    Parameters
+    ----------
+    image : numpy array 2D
+        Greyscale image, bit depth 8.
+    bit_depth : int, optional
+        Number of planes, starting with the least significant bit. The
+        default is 8.
+
+    Returns
+    -------
+    planes : numpy array 3D
+        uint8 array of shape (bit_depth, height, width) holding 0 and 1.
+
+    """
+    image = numpy.asarray(image, dtype=numpy.uint8)
+    planes = numpy.unpackbits(image[numpy.newaxis], axis=0, count=bit_depth,
+                              bitorder='little')
+
+    return planes
+
+
+def _pack_pixels(image):
+    """
+    Pack the three colour bytes of every pixel into one integer.
+
+    Parameters
+    ----------
+    image : numpy array 3D
+        Image of shape (rows, columns, 3) with bit depth 8.
+
+    Returns
+    -------
+    packed : numpy array 2D
+        uint32 array of shape (rows, columns), one value per pixel.
+
+    """
+    image = image.astype(numpy.uint32)
+
+    return (image[:, :, 0] << 16) | (image[:, :, 1] << 8) | image[:, :, 2]
+
+
+def _first_false(mask):
+    """
+    Index of the first False entry at or after each position of a row.
+
+    Parameters
+    ----------
+    mask : boolean numpy array 2D
+        Mask of shape (rows, columns).
+
+    Returns
+    -------
+    index : int numpy array 2D
+        For every position the column of the next False entry in the same
+        row. Rows without a following False entry point to the row width.
+
+    """
+    width = mask.shape[1]
+    index = numpy.where(mask, width, numpy.arange(width, dtype=numpy.int16))
+
+    return numpy.minimum.accumulate(index[:, ::-1], axis=1)[:, ::-1]
+
+
+def _encode_rows(image, packed, above, copy_allowed, row_sizes=False):
+    """
+    Enhanced run length encoding of a block of image rows.
+
+    Every row is parsed from left to right: a run of pixels equal to the
+    row above becomes a copy command, a run of equal pixels a repeat
+    command and a span of pixels that neither repeat nor match the row
+    above a literal command. Instead of walking the pixels, the command
+    that would start at each pixel is computed for the whole block at once
+    and only the command start positions are followed, all rows in
+    lockstep.
+
+    Parameters
+    ----------
+    image : numpy array 3D
+        Rows to encode, shape (rows, 1920, 3), bit depth 8.
+    packed : numpy array 2D
+        The rows packed with _pack_pixels().
+    above : numpy array 2D
+        Packed row above each row. For the first image row this is the
+        last image row.
+    copy_allowed : boolean numpy array
+        Per row, whether copy commands from the row above may be used.
+    row_sizes : boolean, optional
+        Whether to return the number of bytes of every encoded row as well.
+        The default is False.
+
+    Returns
+    -------
+    body : numpy array
+        uint8 array holding the encoded rows, each one closed by the end of
+        line command 0x00 0x00.
+    sizes : numpy array
+        Number of bytes of every encoded row, end of line included. Only
+        returned if row_sizes is True.
+
+    """
+    rows, width = packed.shape
+    columns = numpy.arange(width)
+
+    # pixel equals the row above, with and without the copy restriction
+    same_above = packed == above
+    copy = same_above & copy_allowed[:, None]
+
+    # pixel equals its right neighbour
+    repeat = numpy.zeros((rows, width), dtype=bool)
+    repeat[:, :-1] = packed[:, :-1] == packed[:, 1:]
+
+    # pixel can continue a literal span
+    literal = ~repeat & ~same_above
+    literal[:, -1] = False
+    literal_next = numpy.zeros((rows, width), dtype=bool)
+    literal_next[:, :-1] = literal[:, 1:]
+
+    copy_end = _first_false(copy)
+    run_end = _first_false(repeat)
+    literal_end = numpy.full((rows, width), width)
+    literal_end[:, :-1] = _first_false(literal)[:, 1:]
+
+    is_literal = ~copy & ~repeat & literal_next
+    next_start = numpy.where(copy, copy_end,
+                             numpy.where(is_literal, literal_end,
+                                         run_end + 1))
+
+    # follow the command start positions of all rows in lockstep
+    starts = numpy.zeros((rows, width), dtype=bool)
+    active = numpy.arange(rows)
+    position = numpy.zeros(rows, dtype=numpy.intp)
+    while active.size:
+        starts[active, position] = True
+        position = next_start[active, position]
+        keep = position < width
+        active = active[keep]
+        position = position[keep]
+
+    row, column = numpy.nonzero(starts)
+    is_copy = copy[row, column]
+    is_literal = is_literal[row, column]
+    is_repeat = ~is_copy & ~is_literal
+    count = next_start[row, column] - column
+    count_bytes = 1 + (count >= 128)
+
+    # size of every command and its offset, leaving room for the end of
+    # line command of every preceding row
+    size = count_bytes + numpy.where(is_copy, 2,
+                                     numpy.where(is_literal, 1 + 3 * count,
+                                                 3))
+    offset = numpy.cumsum(size) - size + 2 * row
+
+    body = numpy.zeros(int(size.sum()) + 2 * rows, dtype=numpy.uint8)
+
+    # copy commands start with 0x00 0x01, literal commands with 0x00
+    body[offset[is_copy] + 1] = 0x01
+    length = offset + 2 * is_copy + is_literal
+    body[length] = numpy.where(count < 128, count, (count & 0x7f) | 0x80)
+    long = count >= 128
+    body[length[long] + 1] = count[long] >> 7
+
+    # colour of repeat commands
+    colour = (length + count_bytes)[is_repeat]
+    pixels = image.reshape(rows * width, 3)[(row * width + column)[is_repeat]]
+    for channel in range(3):
+        body[colour + channel] = pixels[:, channel]
+
+    # pixels of literal commands
+    _move_spans(body, (length + count_bytes)[is_literal], image,
+                (row * width + column)[is_literal], count[is_literal])
+
+    if row_sizes:
+        sizes = numpy.bincount(row, weights=size, minlength=rows)
+        return body, sizes.astype(numpy.intp) + 2
+
+    return body
+
+
+def _move_spans(body, target, image, source, count):
+    """
+    Copy spans of pixels from an image into the encoded body.
+
+    The spans keep their order in the image and in the body, so they are
+    moved with two masks in one go.
+
+    Parameters
+    ----------
+    body : numpy array
+        uint8 array the pixels are written to.
+    target : numpy array
+        Byte offset in the body of the first pixel of every span.
+    image : numpy array 3D
+        Image the pixels are taken from, bit depth 8.
+    source : numpy array
+        Pixel index (row * width + column) of the first pixel of every
+        span.
+    count : numpy array
+        Number of pixels of every span.
+
+    Returns
+    -------
+    None.
+
+    """
+    count = 3 * count
+    body[_span_mask(len(body), target, count)] = \
+        image.reshape(-1)[_span_mask(image.size, 3 * source, count)]
+
+
+def _span_mask(size, first, count):
+    """
+    Returns a boolean mask that is True inside the given spans.
+
+    Parameters
+    ----------
+    size : int
+        Length of the mask.
+    first : numpy array
+        First index of every span. The spans must not overlap.
+    count : numpy array
+        Length of every span.
+
+    Returns
+    -------
+    mask : numpy array
+        The mask.
+
+    """
+    mask = numpy.zeros(size + 1, dtype=numpy.int8)
+    mask[first] += 1
+    mask[first + count] -= 1
+
+    return numpy.cumsum(mask[:-1], dtype=numpy.int8).view(bool)
+
+
+def _rle_commands(packed):
+    """
+    Split the rows of an image into the commands of the plain run length
+    encoding.
+
+    Runs of two or more equal pixels become repeat commands, consecutive
+    single pixels are grouped into literal commands. Both take a one byte
+    length, so longer runs are split every 255 pixels.
+
+    Parameters
+    ----------
+    packed : numpy array 2D
+        Packed pixels of the image, as returned by _pack_pixels().
+
+    Returns
+    -------
+    row : numpy array
+        Row of every command.
+    column : numpy array
+        First column of every command.
+    count : numpy array
+        Number of pixels of every command.
+    is_literal : numpy array
+        True for literal commands, False for repeat commands.
+
+    """
+    rows, width = packed.shape
+
+    # start and length of every run of equal pixels, every row starts a run
+    start = numpy.ones((rows, width), dtype=bool)
+    start[:, 1:] = packed[:, 1:] != packed[:, :-1]
+    first = numpy.flatnonzero(start)
+    length = numpy.diff(numpy.append(first, rows * width))
+    single = length == 1
+
+    # runs of two or more pixels, split into repeats of up to 255 pixels
+    run_first = first[~single]
+    run_length = length[~single]
+    chunks = (run_length + 254) // 255
+
+    # groups of single pixels next to each other in the same row
+    previous = numpy.zeros(len(first), dtype=bool)
+    previous[1:] = single[:-1] & (first[1:] % width != 0)
+    group = single & ~previous
+    group_first = first[group]
+    group_length = numpy.bincount(numpy.cumsum(group)[single] - 1,
+                                  minlength=len(group_first))
+    group_chunks = (group_length + 254) // 255
+
+    # split both into commands of up to 255 pixels
+    start = numpy.concatenate((numpy.repeat(run_first, chunks),
+                               numpy.repeat(group_first, group_chunks)))
+    total = numpy.concatenate((numpy.repeat(run_length, chunks),
+                               numpy.repeat(group_length, group_chunks)))
+    chunks = numpy.concatenate((chunks, group_chunks))
+    index = numpy.arange(len(start)) - numpy.repeat(numpy.cumsum(chunks)
+                                                    - chunks, chunks)
+    start = start + 255 * index
+    count = numpy.minimum(total - 255 * index, 255)
+
+    # a single pixel left over is sent as a repeat of one
+    is_literal = numpy.zeros(len(start), dtype=bool)
+    is_literal[int(chunks[:len(run_first)].sum()):] = True
+    is_literal &= count > 1
+
+    order = numpy.argsort(start, kind='stable')
+    start = start[order]
+
+    return (start // width, start % width, count[order],
+            is_literal[order])
+
+
+def _rle_size(commands, rows):
+    """
+    Returns the number of bytes of the encoded rows of the run length
+    encoding.
+    """
+    count, is_literal = commands[2:]
+    return int(numpy.where(is_literal, 2 + 3 * count, 4).sum()) + 2 * rows
+
+
+def _encode_rle_rows(image, commands):
+    """
+    Plain run length encoding of the rows of an image.
+
+    A repeat command is the number of pixels followed by the colour, a
+    literal command is 0x00 and the number of pixels followed by the
+    pixels. Every row ends with the end of line command 0x00 0x00.
+
+    Parameters
+    ----------
+    image : numpy array 3D
+        Image represented as an numpy array, shape (rows, 1920, 3), bit
+        depth 8.
+    commands : tuple
+        Commands of the image, as returned by _rle_commands().
+
+    Returns
+    -------
+    body : numpy array
+        uint8 array holding the encoded rows.
+
+    """
+    rows, width = image.shape[:2]
+    row, column, count, is_literal = commands
+    is_repeat = ~is_literal
+
+    size = numpy.where(is_literal, 2 + 3 * count, 4)
+    offset = numpy.cumsum(size) - size + 2 * row
+
+    body = numpy.zeros(int(size.sum()) + 2 * rows, dtype=numpy.uint8)
+
+    body[offset[is_repeat]] = count[is_repeat]
+    body[offset[is_literal] + 1] = count[is_literal]
+
+    # colour of repeat commands
+    colour = offset[is_repeat] + 1
+    pixels = image.reshape(rows * width, 3)[(row * width + column)[is_repeat]]
+    for channel in range(3):
+        body[colour + channel] = pixels[:, channel]
+
+    # pixels of literal commands
+    _move_spans(body, offset[is_literal] + 2, image,
+                (row * width + column)[is_literal], count[is_literal])
+
+    return body
+
+
+def _encode_strip(image, above, copy_first, compression='erle'):
+    """
+    Encoding of a horizontal strip of an image.
+
+    The encoding of a row only depends on the row itself and on the row
+    above it, so a strip can be encoded on its own given the row just above
+    it.
+
+    Parameters
+    ----------
+    image : numpy array 3D
+        Rows of the strip, shape (rows, 1920, 3), bit depth 8.
+    above : numpy array 2D
+        The image row just above the strip, shape (1920, 3). For the top
+        strip this is the last image row.
+    copy_first : boolean
+        Whether the first row of the strip may copy from the row above.
+        False for the top strip.
+    compression : str, optional
+        'erle', 'rle' or 'uncompressed'. The default is 'erle'.
+
+    Returns
+    -------
+    body : numpy array
+        uint8 array holding the encoded rows of the strip.
+
+    """
+    if compression == 'uncompressed':
+        return numpy.ascontiguousarray(image, dtype=numpy.uint8).reshape(-1)
+
+    packed = _pack_pixels(image)
+    if compression == 'rle':
+        return _encode_rle_rows(image, _rle_commands(packed))
+
+    packed_above = numpy.concatenate((_pack_pixels(above[numpy.newaxis]),
+                                      packed[:-1]))
+    copy_allowed = numpy.ones(len(image), dtype=bool)
+    copy_allowed[0] = copy_first
+
+    return _encode_rows(image, packed, packed_above, copy_allowed)
+
+
+# compression byte of the image header for each encoding, and the end of
+# image command that follows the rows
+COMPRESSIONS = {'uncompressed': 0x00, 'rle': 0x01, 'erle': 0x02}
+_END_OF_IMAGE = {'uncompressed': b'', 'rle': b'\x00\x01',
+                 'erle': b'\x00\x01\x00'}
+
+
+def _frame_size(body_size, compression):
+    """
+    Returns the number of bytes of an encoded image, header and padding
+    included, given the number of bytes of its encoded rows.
+    """
+    size = 48 + body_size + len(_END_OF_IMAGE[compression])
+    return size + (-size) % 4
+
+
+def _encoded_frame(body, width, height, compression='erle'):
+    """
+    Put the header and the end of image command around encoded rows.
+
+    Parameters
+    ----------
+    body : numpy array
+        uint8 array holding all encoded rows of the image.
+    width : int
+        Width of the image in pixels.
+    height : int
+        Height of the image in pixels.
+    compression : str, optional
+        Encoding of the rows, 'erle', 'rle' or 'uncompressed'. The default
+        is 'erle'.
+
+    Returns
+    -------
+    bit_string : bytearray
+        Is the encoded image represented as bytes.
+    byte_count : int
+        Is the number of bytes from the bit string.
+
+    """
+    # header creation
+    byte_count = 48
+    bit_string = []
+
+    bit_string.append(0x53)
+    bit_string.append(0x70)
+    bit_string.append(0x6c)
+    bit_string.append(0x64)
+
+    width = convert_num_to_bit_string(width, 16)
+    width = bits_to_bytes(width)
+    for i in range(len(width)):
+        bit_string.append(width[i])
+
+    height = convert_num_to_bit_string(height, 16)
+    height = bits_to_bytes(height)
+    for i in range(len(height)):
+        bit_string.append(height[i])
+
+    total = convert_num_to_bit_string(0, 32)
+    total = bits_to_bytes(total)
+    for i in range(len(total)):
+        bit_string.append(total[i])
+
+    for i in range(8):
+        bit_string.append(0xff)
+
+    """
+    Setting the background color to black.
+    """
+    for i in range(4):
+        bit_string.append(0x00)
+
+    bit_string.append(0x00)
+
+    """
+    Enhanced run length encoding
+    To achieve higher compression ratios, this compression format takes
+    advantage of the similarities from line-to-line and uses one or two
+    bytes to encode the length.
+    The plain run length encoding uses one byte for the length and does
+    not copy from the line above, uncompressed images are sent pixel by
+    pixel.
+    """
+    bit_string.append(COMPRESSIONS[compression])
+
+    bit_string.append(0x01)
+
+    for i in range(21):
+        bit_string.append(0x00)
+
+    # one contiguous buffer instead of a list of ints
+    bit_string = bytearray(bit_string)
+    bit_string += body.data
+    byte_count += len(body)
+
+    bit_string += _END_OF_IMAGE[compression]
+    byte_count += len(_END_OF_IMAGE[compression])
+
+    while (byte_count) % 4 != 0:
+        bit_string.append(0x00)
+        byte_count += 1
+
+    size = byte_count
+
+    total = convert_num_to_bit_string(size, 32)
+    total = bits_to_bytes(total)
+    for i in range(len(total)):
+        bit_string[i + 8] = total[i]
+
+    return bit_string, byte_count
+
+
+def _check_compression(compression):
+    """
+    Raises a ValueError for an unknown compression.
+    """
+    if compression != 'auto' and compression not in COMPRESSIONS:
+        raise ValueError('Unknown compression %r, use one of %s or auto.'
+                         % (compression, ', '.join(COMPRESSIONS)))
+
+
+def _compare_compressions(image, erle_body):
+    """
+    Returns the size of the image in every compression.
+
+    Parameters
+    ----------
+    image : numpy array 3D
+        Image represented as an numpy array. Bit depth is 8.
+    erle_body : numpy array
+        Enhanced run length encoded rows of the image.
+
+    Returns
+    -------
+    sizes : dict
+        Number of bytes of the encoded image for each compression, the
+        enhanced run length encoding first.
+    commands : tuple
+        Commands of the plain run length encoding, as returned by
+        _rle_commands().
+
+    """
+    commands = _rle_commands(_pack_pixels(image))
+    sizes = {'erle': _frame_size(len(erle_body), 'erle'),
+             'rle': _frame_size(_rle_size(commands, len(image)), 'rle'),
+             'uncompressed': _frame_size(image.size, 'uncompressed')}
+
+    return sizes, commands
+
+
+def _smallest_encoding(image, erle_body):
+    """
+    Returns the compression giving the fewest bytes and the encoded rows.
+
+    On a tie the enhanced run length encoding is kept.
+    """
+    sizes, commands = _compare_compressions(image, erle_body)
+    compression = min(sizes, key=sizes.get)
+
+    if compression == 'rle':
+        return compression, _encode_rle_rows(image, commands)
+    if compression == 'uncompressed':
+        return compression, _encode_strip(image, None, False, compression)
+
+    return compression, erle_body
+
+
+def compression_sizes(image):
+    """
+    Returns the size of the encoded image for every compression.
+
+    Parameters
+    ----------
+    image : numpy array
+        Image represented as an numpy array. Bit depth is 8.
+
+    Returns
+    -------
+    sizes : dict
+        Number of bytes of the encoded image, header included, keyed by
+        'erle', 'rle' and 'uncompressed'.
+
+    """
+    image = numpy.asarray(image, dtype=numpy.uint8)
+    body = _encode_strip(image, image[-1], False)
+
+    return _compare_compressions(image, body)[0]
+
+
+def encoded_compression(encoded):
+    """
+    Returns the compression of an encoded image, read from its header.
+
+    Parameters
+    ----------
+    encoded : bytes-like, numpy array or list
+        The encoded image.
+
+    Returns
+    -------
+    compression : str
+        'erle', 'rle' or 'uncompressed'.
+
+    """
+    code = as_buffer(encoded)[25]
+    for compression in COMPRESSIONS:
+        if COMPRESSIONS[compression] == code:
+            return compression
+
+    raise ValueError('Unknown compression byte 0x%02x.' % code)
+
+
+def encode(image, compression='erle'):
+    """
+    Encode a image into a bit string.
+
+    The pixel data is compressed with the enhanced run length encoding of
+    the DLPC900 by default. The runs are searched with array operations
+    over the whole image, which takes well below a second per image.
+
+    For noisy patterns, such as speckle or random binary masks, the
+    enhanced run length encoding can come out larger than the plain run
+    length encoding or the uncompressed image. With compression='auto'
+    the size of every compression is computed and the smallest one is
+    used, the one chosen is written in the header and can be read back
+    with encoded_compression().
+
+    Parameters
+    ----------
+    image : numpy array
+        Image represented as an numpy array. Bit depth is 8.
+    compression : str, optional
+        'erle', 'rle', 'uncompressed' or 'auto'. The default is 'erle'.
+
+    Returns
+    -------
+    bit_string : bytearray
+        Is the encoded image represented as bytes.
+    byte_count : int
+        Is the number of bytes from the bit string.
+
+    """
+    _check_compression(compression)
+    image = numpy.asarray(image, dtype=numpy.uint8)
+    height, width = image.shape[:2]
+
+    # the first row has no row above to copy from, its literal spans are
+    # still checked against the last row (index -1) as the pixel by pixel
+    # encoder always did, which keeps the output byte for byte the same
+    if compression == 'auto':
+        body = _encode_strip(image, image[-1], False)
+        compression, body = _smallest_encoding(image, body)
+    else:
+        body = _encode_strip(image, image[-1], False, compression)
+
+    return _encoded_frame(body, width, height, compression)
+
+
+class IncrementalEncoder():
+    """
+    Enhanced run length encoder for frames that change only partially.
+
+    The encoder keeps the last merged image and the encoded bytes of every
+    one of its rows. A new image is compared row by row with the last one,
+    only the rows whose content or upper neighbour changed are encoded
+    again and spliced in between the unchanged rows of the last frame.
+    The output is identical to encode().
+
+    Attributes
+    ----------
+    image : numpy array 3D
+        The last encoded merged image, or None.
+    body : numpy array
+        Encoded rows of the last image.
+    row_sizes : numpy array
+        Number of bytes of every encoded row of the last image.
+    encoded_rows : int
+        Number of rows encoded for the last image.
+
+    Methods
+    -------
+    encode()
+        Encodes a merged image, reusing the rows of the last one.
+    reset()
+        Forgets the last image.
+    """
+
+    def __init__(self):
+        """
+        IncrementalEncoder class constructor.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the last image, the next one is encoded in full.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.image = None
+        self.body = None
+        self.row_sizes = None
+        self.encoded_rows = 0
+
+    def encode(self, image):
+        """
+        Encodes a merged image, reusing the rows of the last one.
+
+        Parameters
+        ----------
+        image : numpy array 3D
+            Merged 24 bit image, as returned by merge_images().
+
+        Returns
+        -------
+        bit_string : bytearray
+            Is the encoded image represented as bytes.
+        byte_count : int
+            Is the number of bytes from the bit string.
+
+        """
+        # keep a copy, the caller may change the array for the next frame
+        image = numpy.array(image, dtype=numpy.uint8)
+        height, width = image.shape[:2]
+
+        if self.image is None or self.image.shape != image.shape:
+            dirty = numpy.ones(height, dtype=bool)
+        else:
+            changed = (image != self.image).reshape(height, -1).any(axis=1)
+
+            # a row also depends on the row above it, the first row on the
+            # last one (see encode())
+            dirty = changed | numpy.roll(changed, 1)
+
+        rows = numpy.flatnonzero(dirty)
+        body, sizes = _encode_rows(image[rows], _pack_pixels(image[rows]),
+                                   _pack_pixels(image[rows - 1]), rows > 0,
+                                   row_sizes=True)
+
+        if len(rows) < height:
+            body, sizes = self._splice(dirty, body, sizes)
+
+        self.image = image
+        self.body = body
+        self.row_sizes = sizes
+        self.encoded_rows = len(rows)
+
+        return _encoded_frame(body, width, height)
+
+    def _splice(self, dirty, body, sizes):
+        """
+        Joins the encoded dirty rows with the clean rows of the last image.
+        """
+        row_sizes = self.row_sizes.copy()
+        row_sizes[dirty] = sizes
+
+        # start of every row in the last body, and of every dirty row in
+        # the new one
+        old_start = numpy.concatenate(([0], numpy.cumsum(self.row_sizes)))
+        new_start = numpy.concatenate(([0], numpy.cumsum(sizes)))
+        dirty_before = numpy.concatenate(([0], numpy.cumsum(dirty)))
+
+        # blocks of consecutive rows that are all dirty or all clean
+        edges = numpy.flatnonzero(numpy.diff(dirty)) + 1
+        first = numpy.concatenate(([0], edges))
+        last = numpy.concatenate((edges, [len(dirty)]))
+
+        pieces = []
+        for start, stop in zip(first, last):
+            if dirty[start]:
+                pieces.append(body[new_start[dirty_before[start]]:
+                                   new_start[dirty_before[stop]]])
+            else:
+                pieces.append(self.body[old_start[start]:old_start[stop]])
+
+        return numpy.concatenate(pieces), row_sizes
+
+
+def encode_strips(image, strips=None, executor=None, compression='erle'):
+    """
+    Encode a single image with its rows split over several processes.
+
+    The rows are split into horizontal strips. Each strip is encoded on its
+    own worker, using the row just above it as context, and the strips are
+    joined into one bitstream. The result is identical to encode(), but the
+    latency of a single image drops with the number of workers.
+
+    Parameters
+    ----------
+    image : numpy array
+        Image represented as an numpy array. Bit depth is 8.
+    strips : int, optional
+        Number of strips. If None, one strip per CPU is used. The default
+        is None.
+    executor : concurrent.futures.Executor, optional
+        Pool to encode the strips on. Pass a running pool when encoding
+        interactively, to not pay the start up of the processes for every
+        image. If None, a process pool with one process per strip is
+        started. The default is None.
+    compression : str, optional
+        'erle', 'rle', 'uncompressed' or 'auto', as for encode(). The
+        default is 'erle'.
+
+    Returns
+    -------
+    bit_string : bytearray
+        Is the encoded image represented as bytes.
+    byte_count : int
+        Is the number of bytes from the bit string.
+
+    """
+    _check_compression(compression)
+    image = numpy.asarray(image, dtype=numpy.uint8)
+    height, width = image.shape[:2]
+
+    if strips is None:
+        strips = os.cpu_count() or 1
+    strips = max(1, min(strips, height))
+    if strips == 1 and executor is None:
+        return encode(image, compression)
+
+    bounds = numpy.linspace(0, height, strips + 1).astype(int)
+    rows = [image[bounds[i]:bounds[i + 1]] for i in range(strips)]
+    above = [image[bounds[i] - 1] for i in range(strips)]
+    copy_first = [bounds[i] > 0 for i in range(strips)]
+
+    # with 'auto' the strips are encoded with the enhanced run length
+    # encoding, the other compressions are compared afterwards
+    mode = 'erle' if compression == 'auto' else compression
+    mode = itertools.repeat(mode)
+
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(strips) as pool:
+            bodies = list(pool.map(_encode_strip, rows, above, copy_first,
+                                   mode))
+    else:
+        bodies = list(executor.map(_encode_strip, rows, above, copy_first,
+                                   mode))
+    body = numpy.concatenate(bodies)
+
+    if compression == 'auto':
+        compression, body = _smallest_encoding(image, body)
+
+    return _encoded_frame(body, width, height, compression)
+
+
+def as_buffer(encoded):
+    """
+    Returns encoded data as a flat memoryview of bytes without copying it.
+
+    Parameters
+    ----------
+    encoded : bytes-like, numpy array or list
+        Encoded data, e.g. as returned by encode(), read from a sequence
+        file or from encoded_images.txt. Lists of ints are converted to
+        bytes first.
+
+    Returns
+    -------
+    buffer : memoryview
+        The data as unsigned bytes.
+
+    """
+    if isinstance(encoded, list):
+        encoded = bytes(encoded)
+    elif isinstance(encoded, numpy.ndarray):
+        encoded = numpy.ascontiguousarray(encoded, dtype=numpy.uint8)
+
+    return memoryview(encoded).cast('B')
+
+
+# the command starts of an encoded image are read one by one in batches
+# while the commands are long, and searched from the first bytes of every
+# block of the stream once they are short, see _command_starts()
+_DECODE_BATCH = 2048
+_DECODE_LONG = 32
+_DECODE_BLOCK = 1024
+_DECODE_SEEDS = 8
+
+
+def _command_sizes(data, position, compression):
+    """
+    Returns the size of the commands starting at the given positions.
+
+    Parameters
+    ----------
+    data : numpy array
+        uint8 array holding the encoded image, followed by at least three
+        zero bytes.
+    position : numpy array
+        Byte offset of every command.
+    compression : str
+        'erle' or 'rle'.
+
+    Returns
+    -------
+    size : numpy array
+        Number of bytes of every command.
+    end : numpy array
+        True for the end of image command.
+
+    """
+    b0 = data[position].astype(numpy.int32)
+    b1 = data[position + 1].astype(numpy.int32)
+    b2 = data[position + 2].astype(numpy.int32)
+
+    if compression == 'rle':
+        end = (b0 == 0) & (b1 == 1)
+        size = numpy.where(b0 != 0, 4, numpy.where(b1 < 2, 2, 2 + 3 * b1))
+        return size, end
+
+    # lengths of 128 and more take two bytes
+    end = (b0 == 0) & (b1 == 1) & (b2 == 0)
+    count = numpy.where(b1 < 128, b1, (b1 & 0x7f) | (b2 << 7))
+    size = numpy.where(b0 != 0, 4 + (b0 >= 128),
+                       numpy.where(b1 == 0, 2,
+                                   numpy.where(b1 == 1, 3 + (b2 >= 128),
+                                               2 + (b1 >= 128) + 3 * count)))
+    return size, end
+
+
+def _command_size(data, position, compression):
+    """
+    Returns the size of the command at one position and whether it is the
+    end of image command, like _command_sizes() for a single command.
+    """
+    b0 = data[position]
+    b1 = data[position + 1]
+    b2 = data[position + 2]
+
+    if compression == 'rle':
+        if b0 != 0:
+            return 4, False
+        return (2 if b1 < 2 else 2 + 3 * b1), b1 == 1
+
+    if b0 != 0:
+        return 4 + (b0 >= 128), False
+    if b1 == 0:
+        return 2, False
+    if b1 == 1:
+        return 3 + (b2 >= 128), b2 == 0
+    if b1 < 128:
+        return 2 + 3 * b1, False
+    return 3 + 3 * ((b1 & 0x7f) | (b2 << 7)), False
+
+
+def _command_starts(data, start, stop, compression):
+    """
+    Returns the byte offset of every command of an encoded image.
+
+    Literals and long runs make few commands, which are read one by one.
+    The commands are read in batches of _DECODE_BATCH; once a batch takes
+    less than _DECODE_LONG bytes per command, reading them one by one
+    would be slower than _chain_starts(), which locates the rest.
+
+    Parameters
+    ----------
+    data : numpy array
+        uint8 array holding the encoded image, followed by at least three
+        zero bytes.
+    start : int
+        Byte offset of the first command.
+    stop : int
+        Number of bytes of the encoded image.
+    compression : str
+        'erle' or 'rle'.
+
+    Raises
+    ------
+    ValueError
+        If the commands do not end with an end of image command.
+
+    Returns
+    -------
+    starts : numpy array
+        Byte offset of every command, the end of image command last.
+
+    """
+    view = memoryview(data)
+    starts = []
+    position = start
+    while True:
+        first = position
+        for index in range(_DECODE_BATCH):
+            if position >= stop:
+                raise ValueError('The encoded image has no end of image '
+                                 'command.')
+            starts.append(position)
+            size, end = _command_size(view, position, compression)
+            if end:
+                return numpy.array(starts, dtype=numpy.intp)
+            position += size
+
+        if position - first < _DECODE_BATCH * _DECODE_LONG:
+            break
+
+    return numpy.concatenate((numpy.array(starts, dtype=numpy.intp),
+                              _chain_starts(data, position, stop,
+                                            compression)))
+
+
+def _chain_starts(data, start, stop, compression):
+    """
+    Returns the byte offset of every command of an encoded image, for
+    streams of many short commands.
+
+    The commands have different lengths, so where a command starts is only
+    known once the one before it was read. To read many commands at once,
+    the stream is cut into blocks and the commands are followed from the
+    first bytes of every block, all chains in lockstep, as if a command
+    started there. Chains that run into a command already found by another
+    chain stop there, as they would follow the same commands from then on.
+    Every command found is labelled with its chain.
+
+    The true parse is then traced from the first command on, from chain to
+    chain. Where it leaves a block on a command that no chain found, it is
+    followed command by command until it meets a labelled one.
+
+    Parameters
+    ----------
+    data : numpy array
+        uint8 array holding the encoded image, followed by at least three
+        zero bytes.
+    start : int
+        Byte offset of the first command.
+    stop : int
+        Number of bytes of the encoded image.
+    compression : str
+        'erle' or 'rle'.
+
+    Raises
+    ------
+    ValueError
+        If the commands do not end with an end of image command.
+
+    Returns
+    -------
+    starts : numpy array
+        Byte offset of every command, the end of image command last.
+
+    """
+    if start >= stop:
+        raise ValueError('The encoded image has no end of image command.')
+
+    seeds = numpy.arange(start, stop, _DECODE_BLOCK)
+    limits = numpy.minimum(seeds + _DECODE_BLOCK, stop)
+    seeds = (seeds[:, numpy.newaxis] + numpy.arange(_DECODE_SEEDS)).ravel()
+    limits = numpy.repeat(limits, _DECODE_SEEDS)
+    keep = seeds < limits
+    seeds = seeds[keep]
+    limits = limits[keep]
+
+    # chain owning each command, and where each chain continues: on a
+    # command of another chain or of the next block, -1 after the end of
+    # image command
+    owner = numpy.full(stop + 1, -1, dtype=numpy.int32)
+    leaves = numpy.full(len(seeds), -1)
+    active = numpy.arange(len(seeds))
+    position = seeds
+    while active.size:
+        # chains that meet a command found before, or that meet each other
+        taken = owner[position] >= 0
+        leaves[active[taken]] = position[taken]
+        active = active[~taken]
+        position = position[~taken]
+        owner[position] = active
+        lost = owner[position] != active
+        leaves[active[lost]] = position[lost]
+        active = active[~lost]
+        position = position[~lost]
+
+        size, end = _command_sizes(data, position, compression)
+        position = numpy.minimum(position + size, stop)
+        leave = ~end & (position >= limits[active])
+        leaves[active[leave]] = position[leave]
+        keep = ~end & ~leave
+        active = active[keep]
+        position = position[keep]
+
+    # trace the true parse, which starts with the first chain
+    entries = numpy.full(len(seeds), stop + 1)
+    tail = []
+    view = memoryview(data)
+    chain = 0
+    position = start
+    while True:
+        entries[chain] = position
+        position = int(leaves[chain])
+        if position < 0:
+            break
+
+        # no chain found this command, continue command by command until
+        # a labelled one is met
+        end = False
+        while position < stop and owner[position] < 0:
+            tail.append(position)
+            size, end = _command_size(view, position, compression)
+            if end:
+                break
+            position += size
+        if end:
+            break
+        if position >= stop:
+            raise ValueError('The encoded image has no end of image '
+                             'command.')
+        chain = owner[position]
+
+    # the commands followed one by one belong to the parse as well
+    owner[tail] = len(seeds)
+    entries = numpy.append(entries, 0)
+
+    starts = numpy.flatnonzero(owner[:stop] >= 0)
+
+    return starts[starts >= entries[owner[starts]]]
+
+
+def decode(encoded):
+    """
+    Decode an encoded image back into a 24 bit image.
+
+    Works for all compressions of the DLPC900 and also for images encoded
+    by the MATLAB tools. Few long commands are read one by one, many
+    short ones are located with array operations (see _command_starts()),
+    and all pixels are filled in at once, so that decoding takes at most
+    about as long as encoding, well below a second per frame.
+
+    Parameters
+    ----------
+    encoded : bytes-like, numpy array or list
+        The encoded image, with its header.
+
+    Raises
+    ------
+    ValueError
+        If the encoded image is not valid.
+
+    Returns
+    -------
+    image : numpy array 3D
+        The image, shape (height, width, 3), bit depth 8, like the merged
+        image returned by merge_images().
+
+    """
+    buffer = as_buffer(encoded)
+    if len(buffer) < 48 or bytes(buffer[:4]) != b'Spld':
+        raise ValueError('Not an encoded image.')
+
+    # the size field of the header is not used, the MATLAB tools write the
+    # number of bits of the image there
+    width, height = struct.unpack_from('<HH', buffer, 4)
+    compression = encoded_compression(buffer)
+    size = len(buffer)
+
+    data = numpy.zeros(size + 4, dtype=numpy.uint8)
+    data[:size] = numpy.frombuffer(buffer[:size], dtype=numpy.uint8)
+
+    if compression == 'uncompressed':
+        if size < 48 + width * height * 3:
+            raise ValueError('The encoded image is too short.')
+        return data[48:48 + width * height * 3].reshape(height, width, 3)
+
+    starts = _command_starts(data, 48, size, compression)
+
+    b0 = data[starts]
+    b1 = data[starts + 1]
+    b2 = data[starts + 2]
+
+    # kind of every command
+    repeat = b0 != 0
+    line = ~repeat & (b1 == 0)
+    literal = ~repeat & (b1 > 1)
+    if compression == 'rle':
+        copy = numpy.zeros(len(starts), dtype=bool)
+    else:
+        copy = ~repeat & (b1 == 1) & (b2 != 0)
+
+    # number of pixels of every command and where its pixel data starts,
+    # the enhanced run length encoding takes two bytes for lengths of 128
+    # and more
+    field = starts + numpy.where(repeat, 0, numpy.where(literal, 1, 2))
+    count = data[field].astype(numpy.intp)
+    if compression == 'erle':
+        two = count >= 128
+        count[two] = ((count[two] & 0x7f)
+                      | data[field[two] + 1].astype(numpy.intp) << 7)
+        field += two
+    count[~(repeat | copy | literal)] = 0
+    pixels = field + 1
+
+    # the pixels have to fill the image, end of line commands may only
+    # come at the end of a row; the MATLAB encoder leaves them out and
+    # lets the commands run on into the next row
+    filled = numpy.cumsum(count)
+    if filled[-1] != width * height or numpy.any(filled[line] % width):
+        raise ValueError('The pixels of the encoded image do not match its '
+                         'size %dx%d.' % (width, height))
+
+    # colour of the repeats, then the pixels of the literals
+    colour = data[pixels[:, numpy.newaxis] + numpy.arange(3)]
+    image = numpy.repeat(colour, count, axis=0)
+    span = 3 * count[literal]
+    image.reshape(-1)[_span_mask(image.size, 3 * filled[literal] - span,
+                                 span)] = \
+        data[_span_mask(len(data), pixels[literal], span)]
+    image = image.reshape(height, width, 3)
+
+    # copies from the row above, top to bottom
+    copied = numpy.repeat(copy, count).reshape(height, width)
+    rows = numpy.flatnonzero(copied.any(axis=1))
+    if rows.size and rows[0] == 0:
+        raise ValueError('The first row of the encoded image copies from '
+                         'the row above.')
+    whole = copied[rows].all(axis=1)
+    for row, same in zip(rows, whole):
+        if same:
+            image[row] = image[row - 1]
+        else:
+            image[row, copied[row]] = image[row - 1, copied[row]]
+
+    return image
+
+
+def verify(encoded, image):
+    """
+    Checks that an encoded image decodes back to the given image.
+
+    Parameters
+    ----------
+    encoded : bytes-like, numpy array or list
+        The encoded image, as returned by encode() or read from a sequence
+        file or from encoded_images.txt.
+    image : numpy array 3D
+        The merged image it was encoded from, as returned by
+        merge_images().
+
+    Returns
+    -------
+    valid : boolean
+        True if the encoded image is valid and equals the image.
+
+    """
+    try:
+        decoded = decode(encoded)
+    except ValueError:
+        return False
+
+    return numpy.array_equal(decoded, image)
+
+
+# bump whenever the output of encode() changes, cached encodings of older
+# versions are then no longer used
+ENCODER_VERSION = 2
+
+
+# file name suffix of the cache entries, whatever their compression
+CACHE_SUFFIX = '.enc'
+
+
+class EncodingCache():
+    """
+    On-disk cache of encoded images.
+
+    Every encoded image is stored in its own file, named after a hash of the
+    merged 24 bit image, the compression and the encoder version. Images
+    that were encoded before are read back from the cache instead of being
+    encoded again. The size of the cache is counted by the process that
+    writes to it, worker processes only read from it (see read() and
+    write()).
+    When the cache grows above its size limit, the least recently used
+    entries are removed until it is below 90 % of the limit.
+
+    Attributes
+    ----------
+    directory : str
+        Folder holding the cached encodings.
+    max_bytes : int
+        Size limit of the cache in bytes.
+
+    Methods
+    -------
+    key()
+        Returns the cache key of a merged image.
+    get()
+        Returns the cached encoding of a merged image.
+    put()
+        Stores the encoding of a merged image.
+    read()
+        Returns the cached encoding of a key.
+    write()
+        Stores an encoding under a key.
+    encode()
+        Encodes a merged image, using the cache when possible.
+    clear()
+        Removes all cached encodings.
+    """
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3):
+        """
+        EncodingCache class constructor.
+
+        Parameters
+        ----------
+        directory : str, optional
+            Folder holding the cached encodings. It is created if needed.
+            If None, the folder ".pycrafter6500_cache" in the home directory
+            is used. The default is None.
+        max_bytes : int, optional
+            Size limit of the cache in bytes. The default is 2 GB.
+
+        Returns
+        -------
+        None.
+
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'),
+                                     '.pycrafter6500_cache')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        # bytes held by the entries, counted from the puts after the first
+        # scan of the folder, so that not every put has to scan it
+        self._size = None
+
+    def key(self, image, compression='erle'):
+        """
+        Returns the cache key of a merged image.
+
+        Parameters
+        ----------
+        image : numpy array 3D
+            Merged 24 bit image, as returned by merge_images().
+        compression : str, optional
+            Compression passed to encode(). The default is 'erle'.
+
+        Returns
+        -------
+        key : str
+            Hex digest of the image content, its shape, the compression and
+            the encoder version.
+
+        """
+        image = numpy.ascontiguousarray(image, dtype=numpy.uint8)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(('%d;%s;%s;' % (ENCODER_VERSION, image.shape,
+                                      compression)).encode())
+        digest.update(image.data)
+
+        return digest.hexdigest()
+
+    def _path(self, key):
+        """
+        Returns the file name of a cache entry.
+        """
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, image, compression='erle'):
+        """
+        Returns the cached encoding of a merged image.
+
+        Parameters
+        ----------
+        image : numpy array 3D
+            Merged 24 bit image, as returned by merge_images().
+        compression : str, optional
+            Compression passed to encode(). The default is 'erle'.
+
+        Returns
+        -------
+        encoded : tuple or None
+            The encoded image and its number of bytes, like encode()
+            returns them, or None if the image is not cached.
+
+        """
+        return self.read(self.key(image, compression))
+
+    def read(self, key):
+        """
+        Returns the cached encoding of a key.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, as returned by key().
+
+        Returns
+        -------
+        encoded : tuple or None
+            The encoded image and its number of bytes, like encode()
+            returns them, or None if the key is not cached.
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = bytearray(os.fstat(file.fileno()).st_size)
+                file.readinto(data)
+            # mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return data, len(data)
+
+    def put(self, image, encoded, compression='erle'):
+        """
+        Stores the encoding of a merged image.
+
+        Parameters
+        ----------
+        image : numpy array 3D
+            Merged 24 bit image, as returned by merge_images().
+        encoded : bytes-like
+            The encoded image, as returned by encode().
+        compression : str, optional
+            Compression passed to encode(). The default is 'erle'.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.write(self.key(image, compression), encoded)
+
+    def write(self, key, encoded):
+        """
+        Stores an encoding under a key.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, as returned by key().
+        encoded : bytes-like
+            The encoded image, as returned by encode().
+
+        Returns
+        -------
+        None.
+
+        """
+        path = self._path(key)
+        encoded = as_buffer(encoded)
+
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+
+        # write to a temporary file first, so that other processes never
+        # read a half written entry
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary, 'wb') as file:
+            file.write(encoded)
+        os.replace(temporary, path)
+
+        if self._size is None:
+            self._evict()
+        else:
+            self._size += len(encoded) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def encode(self, image, compression='erle'):
+        """
+        Encodes a merged image, using the cache when possible.
+
+        Parameters
+        ----------
+        image : numpy array 3D
+            Merged 24 bit image, as returned by merge_images().
+        compression : str, optional
+            Compression passed to encode(). The default is 'erle'.
+
+        Returns
+        -------
+        bit_string : bytearray
+            The encoded image.
+        byte_count : int
+            Number of bytes of the encoded image.
+
+        """
+        encoded = self.get(image, compression)
+        if encoded is None:
+            encoded = encode(image, compression)
+            self.put(image, encoded[0], compression)
+
+        return encoded
+
+    def clear(self):
+        """
+        Removes all cached encodings.
+
+        Returns
+        -------
+        None.
+
+        """
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+        self._size = 0
+
+    def _evict(self):
+        """
+        Scans the folder and, above the size limit, removes the least
+        recently used entries until the cache is below 90 % of the limit.
+        Other processes sharing the folder are taken into account here.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(entry[1] for entry in entries)
+        if total > self.max_bytes:
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= 0.9 * self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # already removed by another process
+                    pass
+                total -= size
+
+        self._size = total
+
+
+def _merge_and_encode(images, cache=None, compression='erle',
+                      merge=merge_images, check=False):
+    """
+    Merge the bit planes of one frame and encode the merged image.
+
+    Module level, so that it can be sent to the worker processes of
+    encode_frames().
+
+    Parameters
+    ----------
+    images : numpy array 2D list
+        Bit planes of the frame, as passed to merge_images().
+    cache : EncodingCache, optional
+        Cache to take the encoding from, or to store it in. The default is
+        None.
+    compression : str, optional
+        Compression passed to encode(). The default is 'erle'.
+    merge : function, optional
+        Function merging the images into one frame. The default is
+        merge_images().
+    check : boolean, optional
+        Decode the encoded image and compare it with the merged one, see
+        verify(). The default is False.
+
+    Raises
+    ------
+    ValueError
+        If check is set and the encoded image does not decode back to the
+        merged one.
+
+    Returns
+    -------
+    bit_string : bytearray
+        The encoded image.
+    byte_count : int
+        Number of bytes of the encoded image.
+
+    """
+    merged = merge(images)
+    try:
+        if cache is None:
+            encoded = encode(merged, compression)
+        else:
+            encoded = cache.encode(merged, compression)
+
+        if check and not verify(encoded[0], merged):
+            raise ValueError('An encoded frame does not decode back to its '
+                             'merged image.')
+        return encoded
+    finally:
+        FRAME_POOL.give(merged)
+
+
+def _merge_and_lookup(images, cache, compression='erle',
+                      merge=merge_images, check=False):
+    """
+    Like _merge_and_encode(), but only reads from the cache. The worker
+    processes of encode_frames() run it, the encodings not cached yet are
+    stored by the calling process, which counts the size of the cache.
+
+    Returns
+    -------
+    encoded : tuple
+        The encoded image and its number of bytes.
+    key : str or None
+        Cache key to store the encoding under, None if it was cached.
+
+    """
+    merged = merge(images)
+    try:
+        key = cache.key(merged, compression)
+        encoded = cache.read(key)
+        if encoded is None:
+            encoded = encode(merged, compression)
+        else:
+            key = None
+
+        if check and not verify(encoded[0], merged):
+            raise ValueError('An encoded frame does not decode back to its '
+                             'merged image.')
+        return encoded, key
+    finally:
+        FRAME_POOL.give(merged)
+
+
+def _store_encoding(cache, result):
+    """
+    Stores the encoding returned by _merge_and_lookup() in the cache if it
+    was not cached, and returns it.
+    """
+    if cache is None:
+        return result
+
+    encoded, key = result
+    if key is not None:
+        cache.write(key, encoded[0])
+
+    return encoded
+
+
+def encode_frames(frames, processes=None, cache=None, compression='erle',
+                  merge=merge_images, ahead=None, check=False):
+    """
+    Merge and encode several frames on a pool of worker processes.
+
+    The frames are independent from each other, so each one is merged and
+    encoded on its own worker. The results are yielded in the order of
+    the frames as soon as they are ready, so the caller can report the
+    progress frame by frame.
+
+    Parameters
+    ----------
+    frames : list
+        One entry per frame, each being the bit planes or images passed to
+        the merge function.
+    processes : int, optional
+        Number of worker processes. If None, one process per CPU is used.
+        With 1 the frames are encoded in the calling process. The default
+        is None.
+    cache : EncodingCache, optional
+        Cache of encoded images. Frames found in it are not encoded again.
+        The default is None.
+    compression : str, optional
+        Compression passed to encode(), use 'auto' to pick the smallest
+        one frame by frame. The default is 'erle'.
+    merge : function, optional
+        Function merging the entries of a frame, merge_images() for bit
+        planes or merge_greyscale_images() for greyscale images. The
+        default is merge_images().
+    ahead : int, optional
+        Number of encoded frames buffered for the caller. Every worker
+        encodes a frame and up to ahead more wait to be taken, so the
+        workers keep encoding while the caller works on the frames already
+        yielded, e.g. uploads them, and the memory held by encoded frames
+        stays bounded. If None, all the frames are handed to the workers at
+        once. The default is None.
+    check : boolean, optional
+        Preflight: every encoded frame is decoded on its worker and
+        compared with the merged frame, see verify(). The default is
+        False.
+
+    Raises
+    ------
+    ValueError
+        If ahead is negative, or if check is set and a frame does not
+        decode back to its merged image.
+
+    Yields
+    ------
+    bit_string : bytearray
+        The encoded image of the next frame.
+    byte_count : int
+        Number of bytes of the encoded image.
+
+    """
+    if ahead is not None and ahead < 0:
+        raise ValueError('ahead must not be negative, not %r.' % (ahead,))
+
+    if processes == 1 or len(frames) < 2:
+        for images in frames:
+            yield _merge_and_encode(images, cache, compression, merge,
+                                    check)
+        return
+
+    # with a cache the workers only read from it, the encodings are stored
+    # here so that one process counts its size
+    worker = _merge_and_encode if cache is None else _merge_and_lookup
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        if ahead is None:
+            for result in executor.map(worker, frames,
+                                       itertools.repeat(cache),
+                                       itertools.repeat(compression),
+                                       itertools.repeat(merge),
+                                       itertools.repeat(check)):
+                yield _store_encoding(cache, result)
+            return
+
+        # a new frame is handed to the workers whenever the caller takes
+        # one, so one frame per worker and ahead more are in flight
+        workers = processes or os.cpu_count() or 1
+        remaining = iter(frames)
+        pending = collections.deque(
+            executor.submit(worker, images, cache, compression, merge, check)
+            for images in itertools.islice(remaining, workers + ahead))
+
+        while pending:
+            result = pending.popleft().result()
+
+            for images in itertools.islice(remaining, 1):
+                pending.append(executor.submit(worker, images, cache,
+                                               compression, merge, check))
+
+            yield _store_encoding(cache, result)
+
+
+# binary sequence file: header, the encoded images, the frame index (offset
+# & size of every encoded image) and the sequence parameters as text
+SEQUENCE_MAGIC = b'PC6500SQ'
+SEQUENCE_VERSION = 1
+_SEQUENCE_HEADER = struct.Struct('<8sIIQQQ')
+_SEQUENCE_INDEX = struct.Struct('<QQ')
+
+
+def _parameter_lines(parameters):
+    """
+    Formats sequence parameters like the lines of sequence_param.txt.
+
+    Parameters
+    ----------
+    parameters : list
+        One list per image: name, index, brightness, exposure, dark time,
+        trigger in, trigger out and bit depth.
+
+    Returns
+    -------
+    text : str
+        The parameters, one image per line.
+
+    """
+    lines = []
+    for line in parameters:
+        lines.append('; '.join(str(element) for element in line) + ';\n')
+
+    return ''.join(lines)
+
+
+def _parse_parameter_lines(text):
+    """
+    Parses sequence parameters written by _parameter_lines().
+
+    Parameters
+    ----------
+    text : str
+        The parameters, one image per line.
+
+    Returns
+    -------
+    parameters : list
+        One list per image: the name followed by the integer parameters.
+
+    """
+    parameters = []
+    for line in text.splitlines():
+        splitted_line = line.split(';')
+        del splitted_line[8:len(splitted_line)]
+        name = splitted_line[0].strip()
+        values = [int(element) for element in splitted_line[1:]
+                  if element.strip()]
+        parameters.append([name] + values)
+
+    return parameters
+
+
+def write_sequence_file(file_name, encoded, parameters=None):
+    """
+    Writes encoded images and their sequence parameters to a binary file.
+
+    The encoded images are stored as raw bytes, followed by an index of
+    their offsets and sizes, so that SequenceFile can map them directly
+    from the file without any parsing. The images are written one by one,
+    so encoded can be a generator.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the sequence file.
+    encoded : iterable
+        Encoded images, each as returned by encode() or as bytes.
+    parameters : list, optional
+        One list per image: name, index, brightness, exposure, dark time,
+        trigger in, trigger out and bit depth. The default is None.
+
+    Returns
+    -------
+    None.
+
+    """
+    # write a temporary file first, an open SequenceFile of the old file
+    # keeps working until it is closed
+    temporary = file_name + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(bytes(_SEQUENCE_HEADER.size))
+
+        # frames start on 64 byte boundaries
+        index = []
+        for frame in encoded:
+            file.write(bytes(-file.tell() % 64))
+            frame = as_buffer(frame)
+            index.append((file.tell(), len(frame)))
+            file.write(frame)
+
+        index_offset = file.tell()
+        for frame_offset, frame_size in index:
+            file.write(_SEQUENCE_INDEX.pack(frame_offset, frame_size))
+        # the parameters may be filled in while the frames are generated
+        if parameters is None:
+            parameters = []
+        text = _parameter_lines(parameters).encode('utf-8')
+        parameter_offset = file.tell()
+        file.write(text)
+
+        file.seek(0)
+        file.write(_SEQUENCE_HEADER.pack(SEQUENCE_MAGIC, SEQUENCE_VERSION,
+                                         len(index), index_offset,
+                                         parameter_offset, len(text)))
+    os.replace(temporary, file_name)
+
+
+class SequenceFile():
+    """
+    Memory mapped binary sequence file.
+
+    The encoded images are memoryviews into the mapped file. They can be
+    handed to DMD.load_bmp() as they are.
+
+    Attributes
+    ----------
+    file_name : str
+        Name of the sequence file.
+    frames : list
+        One memoryview per encoded image.
+    parameters : list
+        One list per image: name, index, brightness, exposure, dark time,
+        trigger in, trigger out and bit depth.
+
+    Methods
+    -------
+    names()
+        Returns the image names.
+    close()
+        Releases the frames and unmaps the file.
+    """
+
+    def __init__(self, file_name):
+        """
+        Opens and maps a file written by write_sequence_file().
+
+        Parameters
+        ----------
+        file_name : str
+            Name of the sequence file.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a sequence file of a supported version.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.file_name = file_name
+        with open(file_name, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, count, index_offset, parameter_offset,
+         parameter_size) = _SEQUENCE_HEADER.unpack_from(self._mmap, 0)
+        if magic != SEQUENCE_MAGIC:
+            self._mmap.close()
+            raise ValueError('%s is not a sequence file.' % (file_name))
+        if version != SEQUENCE_VERSION:
+            self._mmap.close()
+            raise ValueError('Sequence file version %d is not supported.'
+                             % (version))
+
+        self._buffer = memoryview(self._mmap)
+        self.frames = []
+        for index in range(count):
+            frame_offset, frame_size = _SEQUENCE_INDEX.unpack_from(
+                self._mmap, index_offset + _SEQUENCE_INDEX.size * index)
+            self.frames.append(
+                self._buffer[frame_offset:frame_offset + frame_size])
+
+        text = self._mmap[parameter_offset:parameter_offset + parameter_size]
+        self.parameters = _parse_parameter_lines(text.decode('utf-8'))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def names(self):
+        """
+        Returns the image names.
+
+        Returns
+        -------
+        names : list
+            The name of each image, in the order of the frames.
+
+        """
+        return [line[0] for line in self.parameters]
+
+    def close(self):
+        """
+        Releases the frames and unmaps the file. Frames handed out before
+        can not be used afterwards.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self._mmap.closed:
+            return
+        for frame in self.frames:
+            frame.release()
+        self._buffer.release()
+        self._mmap.close()
+
+
+# ASCII of "0, " to "255, ", padded to 5 bytes, and the used length
+_TEXT_BYTES = numpy.zeros((256, 5), dtype=numpy.uint8)
+_TEXT_LENGTHS = numpy.zeros(256, dtype=numpy.intp)
+for _value in range(256):
+    _text = ('%d, ' % (_value)).encode('ascii')
+    _TEXT_BYTES[_value, :len(_text)] = list(_text)
+    _TEXT_LENGTHS[_value] = len(_text)
+del _value, _text
+
+
+def iter_encoded_text(file_name):
+    """
+    Reads the encoded_images.txt format of the MATLAB encoding_gui image by
+    image.
+
+    The first line is ignored. Then every image takes two lines: its name
+    followed by a comma and its encoded bytes as comma separated numbers.
+    Only the lines of one image are held in memory at a time and the
+    numbers are converted in one go by numpy.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the text file.
+
+    Raises
+    ------
+    ValueError
+        If an encoded value is not a number or does not fit in a byte.
+
+    Yields
+    ------
+    name : str
+        The image name.
+    encoded : numpy array
+        uint8 array of the encoded image.
+
+    """
+    with open(file_name, 'r') as file:
+        # first line will be ignored
+        file.readline()
+
+        name = None
+        for line in file:
+            # uneven numbered lines are image names
+            if name is None:
+                name = line.split(',')[0]
+                continue
+
+            # even numbered lines are encoded data, commas and whitespace
+            # both separate the numbers; a malformed number raises
+            values = numpy.array(line.replace(',', ' ').split(),
+                                 dtype=numpy.int64)
+            if values.size and (values.min() < 0 or values.max() > 255):
+                raise ValueError('Encoded data of %s is not in bytes.'
+                                 % (name))
+            yield name, values.astype(numpy.uint8)
+            name = None
+
+
+def read_encoded_text(file_name):
+    """
+    Reads the encoded_images.txt format of the MATLAB encoding_gui.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the text file.
+
+    Returns
+    -------
+    names : list
+        The image names.
+    encoded : list
+        The encoded images as uint8 numpy arrays.
+
+    """
+    names = []
+    encoded = []
+    for name, encoded_image in iter_encoded_text(file_name):
+        names.append(name)
+        encoded.append(encoded_image)
+
+    return names, encoded
+
+
+def format_encoded_text(encoded_image):
+    """
+    Formats an encoded image as a data line of encoded_images.txt.
+
+    Every byte is written as its decimal number followed by ", ". The text
+    is assembled from a lookup table in one go.
+
+    Parameters
+    ----------
+    encoded_image : list, bytes or numpy array
+        The encoded image.
+
+    Returns
+    -------
+    line : str
+        The data line, including the line break.
+
+    """
+    values = numpy.frombuffer(as_buffer(encoded_image), dtype=numpy.uint8)
+    used = (numpy.arange(5) < _TEXT_LENGTHS[values][:, numpy.newaxis])
+
+    return _TEXT_BYTES[values][used].tobytes().decode('ascii') + '\n'
+
+
+def write_encoded_text(file_name, names, encoded):
+    """
+    Writes encoded images in the encoded_images.txt format.
+
+    The images are written one by one, so encoded can be a generator.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the text file.
+    names : list
+        The image names.
+    encoded : iterable
+        The encoded images.
+
+    Returns
+    -------
+    None.
+
+    """
+    with open(file_name, 'w') as file:
+        file.write('First Line will be ignored\n')
+        for name, encoded_image in zip(names, encoded):
+            # write the image name
+            file.write(name + ',\n')
+            # write encoding data
+            file.write(format_encoded_text(encoded_image))
+
+
+def import_encoded_text(text_file_name, sequence_file_name,
+                        parameters=None):
+    """
+    Converts an encoded_images.txt file into a binary sequence file.
+
+    Parameters
+    ----------
+    text_file_name : str
+        Name of the text file.
+    sequence_file_name : str
+        Name of the sequence file to write.
+    parameters : list, optional
+        Sequence parameters of the images, one list per image starting with
+        the image name. Images are stored in the order of the parameters.
+        If None, the images keep the order of the text file and only their
+        names are stored. The default is None.
+
+    Returns
+    -------
+    None.
+
+    """
+    if parameters is None:
+        # stream the images straight from the text into the sequence file
+        parameters = []
+
+        def frames():
+            for name, encoded_image in iter_encoded_text(text_file_name):
+                parameters.append([name])
+                yield encoded_image
+
+        write_sequence_file(sequence_file_name, frames(), parameters)
+    else:
+        names, encoded = read_encoded_text(text_file_name)
+        encoded = [encoded[names.index(line[0])] for line in parameters]
+        write_sequence_file(sequence_file_name, encoded, parameters)
+
+
+def export_encoded_text(sequence_file_name, text_file_name):
+    """
+    Converts a binary sequence file into an encoded_images.txt file, e.g. to
+    use the encoding with the MATLAB tools.
+
+    Parameters
+    ----------
+    sequence_file_name : str
+        Name of the sequence file.
+    text_file_name : str
+        Name of the text file to write.
+
+    Returns
+    -------
+    None.
+
+    """
+    with SequenceFile(sequence_file_name) as sequence:
+        write_encoded_text(text_file_name, sequence.names(), sequence.frames)
+
+
+# usb reports: flag byte (bit 7 set for reads, bit 6 set when a reply is
+# requested), sequence byte, length of the command and payload, command
+# bytes 2 and 1
+_REPORT_FLAGS = {'r': 0xc0, 'w': 0x40}
+_REPLY_FLAG = 0x40
+_REPORT_HEADER = struct.Struct('<BBHBB')
+_REPORT_SIZE = 64
+
+# the controller is a full speed usb device, its interrupt endpoint takes one
+# 64 byte report per 1 ms frame
+HID_BYTES_PER_SECOND = 64000
+
+# when DMD commands are checked for errors, see DMD.error_check
+ERROR_CHECK_POLICIES = ('command', 'batch', 'upload', 'off')
+
+# payload of define_pattern(): index, exposure (24 bit), options, dark time
+# (24 bit), trigger out, bit position and pattern index
+_PATTERN_PAYLOAD = struct.Struct('<HHBBHBBH')
+_LUT_PAYLOAD = struct.Struct('<HI')
+_BMP_INDEX_PAYLOAD = struct.Struct('<HI')
+
+_report_headers = {}
+
+# the sequence byte of a header, by its value
+_SEQUENCE_BYTES = [bytes((value,)) for value in range(256)]
+
+
+def _check_field(name, value, bits):
+    """
+    Returns value as int, raises a ValueError if it does not fit in its
+    field of the command.
+    """
+    value = int(value)
+    if value < 0 or value >> bits:
+        raise ValueError('%s %d does not fit in %d bits.'
+                         % (name, value, bits))
+
+    return value
+
+
+def command_header(mode, byte_sequence, com1, com2, length, reply=True):
+    """
+    Returns the header of a usb command, built once for every command and
+    payload length and then taken from a table. The sequence byte changes
+    from command to command, it is written into a copy of the header.
+
+    Parameters
+    ----------
+    mode : str
+        Read or write mode. Choose eiter 'r' (read) or 'w' (write).
+    byte_sequence : int
+        Sequence byte of the command.
+    com1 : int
+        Command Byte 1.
+    com2 : int
+        Command Byte 2.
+    length : int
+        Number of payload bytes.
+    reply : boolean, optional
+        Request a reply from the controler. Reads always get one. The
+        default is True.
+
+    Returns
+    -------
+    header : bytes
+        The 6 header bytes.
+
+    """
+    key = (mode, com1, com2, length, reply)
+    header = _report_headers.get(key)
+    if header is None:
+        flags = _REPORT_FLAGS[mode]
+        if not reply and mode != 'r':
+            flags &= ~_REPLY_FLAG
+        header = _REPORT_HEADER.pack(flags, 0, length + 2, com2, com1)
+        _report_headers[key] = header
+
+    return header[:1] + _SEQUENCE_BYTES[byte_sequence] + header[2:]
+
+
+def command_packet(mode, byte_sequence, com1, com2, data=b'', reply=True):
+    """
+    Returns a usb command with its payload, not yet split into reports.
+
+    Parameters
+    ----------
+    mode : str
+        Read or write mode. Choose eiter 'r' (read) or 'w' (write).
+    byte_sequence : int
+        Sequence byte of the command.
+    com1 : int
+        Command Byte 1.
+    com2 : int
+        Command Byte 2.
+    data : bytes-like or byte list, optional
+        Payload of the command. The default is b''.
+    reply : boolean, optional
+        Request a reply from the controler. Reads always get one. The
+        default is True.
+
+    Returns
+    -------
+    packet : bytes
+        Header and payload.
+
+    """
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+
+    return command_header(mode, byte_sequence, com1, com2, len(data),
+                          reply) + data
+
+
+def pattern_payload(index, exposure, bit_depth, color, trigger_in,
+                    dark_time, trigger_out, pat_ind, bit_pos):
+    """
+    Returns the payload of DMD.define_pattern().
+
+    Parameters
+    ----------
+    index : int
+        Index of the pattern in the look up table.
+    exposure : int
+        Exposure time in [us].
+    bit_depth : int
+        Bit depth of the pattern.
+    color : str
+        Color to display as 3 bit string, '100' for the blue LED.
+    trigger_in : bool
+        Wait for an external trigger before the exposure.
+    dark_time : int
+        Dark time in [us].
+    trigger_out : int
+        Trigger out setting.
+    pat_ind : int
+        Index of the frame in the pattern memory.
+    bit_pos : int
+        Bit position in the frame.
+
+    Raises
+    ------
+    ValueError
+        If a value does not fit in its field.
+
+    Returns
+    -------
+    payload : bytes
+        The 12 payload bytes.
+
+    """
+    exposure = _check_field('Exposure', exposure, 24)
+    dark_time = _check_field('Dark time', dark_time, 24)
+    options = (bool(trigger_in) << 7 | _check_field('Color', int(color, 2), 3)
+               << 4 | _check_field('Bit depth', bit_depth - 1, 3) << 1 | 1)
+
+    return _PATTERN_PAYLOAD.pack(
+        _check_field('Index', index, 16), exposure & 0xffff, exposure >> 16,
+        options, dark_time & 0xffff, dark_time >> 16,
+        _check_field('Trigger out', trigger_out, 8),
+        _check_field('Bit position', bit_pos, 5) << 11
+        | _check_field('Pattern index', pat_ind, 11))
+
+
+def lut_payload(image_number, repetition_number):
+    """
+    Returns the payload of DMD.configure_lut().
+
+    Parameters
+    ----------
+    image_number : int
+        Number of patterns in the look up table.
+    repetition_number : int
+        How often the sequence is repeated, 0 for an infinit loop.
+
+    Returns
+    -------
+    payload : bytes
+        The 6 payload bytes.
+
+    """
+    return _LUT_PAYLOAD.pack(
+        _check_field('Image number', image_number, 11),
+        _check_field('Repetition number', repetition_number, 32))
+
+
+def bmp_index_payload(index, size):
+    """
+    Returns the payload of DMD.set_bmp().
+
+    Parameters
+    ----------
+    index : int
+        Index of the frame in the pattern memory.
+    size : int
+        Number of bytes of the encoded frame.
+
+    Returns
+    -------
+    payload : bytes
+        The 6 payload bytes.
+
+    """
+    return _BMP_INDEX_PAYLOAD.pack(_check_field('Frame index', index, 16),
+                                   _check_field('Size', size, 32))
+
+
+# oversleep of time.sleep() in [us] assumed until one is measured, the sleep
+# of Windows before Python 3.11 has the 15.6 ms resolution of its timer
+if sys.platform == 'win32' and sys.version_info < (3, 11):
+    DEFAULT_OVERSLEEP = 16000
+else:
+    DEFAULT_OVERSLEEP = 2000
+
+# bounds of the calibrated spin threshold in [us]
+MIN_SPIN_THRESHOLD = 500
+MAX_SPIN_THRESHOLD = 2 * DEFAULT_OVERSLEEP
+
+# time in [us] a work step of unknown duration may take, the first step of
+# a timer is only started with that much time left before spinning
+FIRST_STEP_BUDGET = 10000
+
+
+class FrameTimer():
+    """
+    Wall clock timer of the exposures and dark times of a sequence shown
+    by the computer.
+
+    A wait sleeps until less than the spin threshold is left and spins on
+    time.perf_counter_ns() for the rest, so that it ends within a few
+    microseconds of its deadline without keeping a core busy for the whole
+    wait. Every wait is recorded, the waited time minus the requested one
+    is its jitter.
+
+    The threshold has to cover the oversleep of time.sleep(), a sleep
+    ending after the deadline makes the wait late whatever is spun. A
+    larger threshold keeps a core busy longer on every wait, a smaller one
+    risks late waits. By default it is calibrated from the oversleep of
+    the sleeps of the timer: the moving average of the oversleep plus four
+    times its moving mean deviation, the way TCP estimates its retransmit
+    timeout, so that a single late wake up is forgotten after some sleeps.
+    It is kept between MIN_SPIN_THRESHOLD and MAX_SPIN_THRESHOLD, and is
+    DEFAULT_OVERSLEEP before the first sleep.
+
+    Attributes
+    ----------
+    spin_threshold : int
+        Time in [us] before the deadline from which a wait spins instead
+        of sleeping. If None, it is calibrated, see threshold().
+    oversleep : float
+        Moving average of the oversleep of time.sleep() in [us], None
+        before the first sleep.
+    oversleep_deviation : float
+        Moving mean deviation of the oversleep in [us], None before the
+        first sleep.
+    records : list of tuple
+        (index, kind, requested, waited) of every wait, times in [us].
+
+    Methods
+    -------
+    now()
+        Returns the current time in [ns].
+    threshold()
+        Returns the spin threshold in use.
+    wait()
+        Waits until a time after a start.
+    jitter()
+        Returns the jitter of the recorded waits.
+    statistics()
+        Returns the mean, spread and extremes of the jitter.
+    reset()
+        Drops the recorded waits and the calibration.
+    """
+
+    def __init__(self, spin_threshold=None):
+        """
+        FrameTimer class constructor.
+
+        Parameters
+        ----------
+        spin_threshold : int, optional
+            Time in [us] before the deadline from which a wait spins. If
+            None, it is calibrated from the measured oversleep. The default
+            is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.spin_threshold = spin_threshold
+        self.oversleep = None
+        self.oversleep_deviation = None
+        self.records = []
+
+        # duration of the last step of the work done while waiting, None
+        # before the first one
+        self._step_ns = None
+
+    def now(self):
+        """
+        Returns the current time of the timer.
+
+        Returns
+        -------
+        now : int
+            time.perf_counter_ns() in [ns].
+
+        """
+        return time.perf_counter_ns()
+
+    def threshold(self):
+        """
+        Returns the spin threshold in use.
+
+        Returns
+        -------
+        spin_threshold : float
+            spin_threshold if it is set, else the calibrated one in [us].
+
+        """
+        if self.spin_threshold is not None:
+            return self.spin_threshold
+        if self.oversleep is None:
+            threshold = DEFAULT_OVERSLEEP
+        else:
+            threshold = self.oversleep + 4 * self.oversleep_deviation
+
+        return min(max(threshold, MIN_SPIN_THRESHOLD), MAX_SPIN_THRESHOLD)
+
+    def _measure_oversleep(self, overslept):
+        """
+        Updates the moving average and mean deviation of the oversleep with
+        one measured in [us].
+        """
+        if self.oversleep is None:
+            self.oversleep = overslept
+            self.oversleep_deviation = overslept / 2
+        else:
+            self.oversleep_deviation += (abs(overslept - self.oversleep)
+                                         - self.oversleep_deviation) / 4
+            self.oversleep += (overslept - self.oversleep) / 8
+
+    def wait(self, duration, start=None, work=None, index=None,
+             kind='exposure', spin_threshold=None):
+        """
+        Waits until duration after start.
 
-    """
-    
-    # header creation
-    byte_count = 48
-    bit_string = []
+        Parameters
+        ----------
+        duration : int
+            Time to wait in [us].
+        start : int, optional
+            Time in [ns] the wait counts from, as returned by now(). If
+            None, the wait starts now. The default is None.
+        work : generator, optional
+            Steps run instead of sleeping, e.g. the chunks of
+            DMD.upload_frame_steps(). A step is only started while the
+            last one still fits in the time left before spinning, the
+            first one while FIRST_STEP_BUDGET does. The default is None.
+        index : int, optional
+            Index of the image, recorded with the wait. The default is
+            None.
+        kind : str, optional
+            What is waited for, recorded with the wait, e.g. 'exposure'
+            or 'dark'. The default is 'exposure'.
+        spin_threshold : int, optional
+            Time in [us] before the deadline from which this wait spins.
+            If None, the one of the timer is used, see threshold(). The
+            default is None.
 
-    bit_string.append(0x53)
-    bit_string.append(0x70)
-    bit_string.append(0x6c)
-    bit_string.append(0x64)
+        Returns
+        -------
+        waited : float
+            Time waited since start in [us].
+        work : generator
+            The work given, or None once it has no steps left.
 
-    width = convert_num_to_bit_string(1920, 16)
-    width = bits_to_bytes(width)
-    for i in range(len(width)):
-        bit_string.append(width[i])
+        """
+        if start is None:
+            start = time.perf_counter_ns()
+        calibrated = spin_threshold is None and self.spin_threshold is None
+        if spin_threshold is None:
+            spin_threshold = self.threshold()
+
+        deadline = start + int(duration * 1000)
+        spin = int(spin_threshold * 1000)
+
+        while True:
+            remaining = deadline - time.perf_counter_ns()
+            if remaining <= spin:
+                break
+
+            step_ns = (FIRST_STEP_BUDGET * 1000 if self._step_ns is None
+                       else self._step_ns)
+            if work is not None and remaining > spin + step_ns:
+                step_start = time.perf_counter_ns()
+                if next(work, None) is None:
+                    work = None
+                self._step_ns = time.perf_counter_ns() - step_start
+            else:
+                # the oversleep of every sleep calibrates the threshold
+                requested = remaining - spin
+                sleep_start = time.perf_counter_ns()
+                time.sleep(requested * 1e-9)
+                overslept = (time.perf_counter_ns() - sleep_start
+                             - requested) / 1000
+                self._measure_oversleep(max(overslept, 0.0))
+                if calibrated:
+                    spin = int(self.threshold() * 1000)
 
-    height = convert_num_to_bit_string(1080, 16)
-    height = bits_to_bytes(height)
-    for i in range(len(height)):
-        bit_string.append(height[i])
+        while time.perf_counter_ns() < deadline:
+            pass
 
-    total = convert_num_to_bit_string(0, 32)
-    total = bits_to_bytes(total)
-    for i in range(len(total)):
-        bit_string.append(total[i])
+        waited = (time.perf_counter_ns() - start) / 1000
+        self.records.append((index, kind, duration, waited))
 
-    for i in range(8):
-        bit_string.append(0xff)
+        return waited, work
 
-    """
-    Setting the background color to black.
-    """
-    for i in range(4):
-        bit_string.append(0x00)
+    def jitter(self, kind=None):
+        """
+        Returns the jitter of the recorded waits.
 
-    bit_string.append(0x00)
+        Parameters
+        ----------
+        kind : str, optional
+            Only the waits of this kind. If None, all waits. The default
+            is None.
 
-    """
-    Enhanced run length encoding
-    To achieve higher compression ratios, this compression format takes
-    advantage of the similarities from line-to-line and uses one or two
-    bytes to encode the length.
-    """
-    bit_string.append(0x02)
+        Returns
+        -------
+        jitter : numpy array
+            Waited minus requested time in [us] of every wait.
 
-    bit_string.append(0x01)
+        """
+        return numpy.array([waited - requested
+                            for index, record_kind, requested, waited
+                            in self.records
+                            if kind is None or record_kind == kind],
+                           dtype=float)
 
-    for i in range(21):
-        bit_string.append(0x00)
+    def statistics(self, kind=None):
+        """
+        Returns the mean, spread and extremes of the jitter.
 
-    n = 0
-    i = 0
-    j = 0
-
-    while i < 1080:
-        while j < 1920:
-            if i > 0 and numpy.all(image[i, j, :] == image[i - 1, j, :]):
-                while j < 1920 and numpy.all(
-                        image[i, j, :] == image[i - 1, j, :]):
-                    n = n + 1
-                    j = j + 1
-
-                bit_string.append(0x00)
-                bit_string.append(0x01)
-                byte_count += 2
-
-                if n >= 128:
-                    byte1 = (n & 0x7f) | 0x80
-                    byte2 = (n >> 7)
-                    bit_string.append(byte1)
-                    bit_string.append(byte2)
-                    byte_count += 2
+        Parameters
+        ----------
+        kind : str, optional
+            Only the waits of this kind. If None, all waits. The default
+            is None.
 
-                else:
-                    bit_string.append(n)
-                    byte_count += 1
-                n = 0
-            else:
-                if j < 1919 and numpy.all(
-                        image[i, j, :] == image[i, j + 1, :]):
-                    n = n + 1
-                    while j < 1919 and numpy.all(
-                            image[i, j, :] == image[i, j + 1, :]):
-                        n = n + 1
-                        j = j + 1
-                    if n >= 128:
-                        byte1 = (n & 0x7f) | 0x80
-                        byte2 = (n >> 7)
-                        bit_string.append(byte1)
-                        bit_string.append(byte2)
-                        byte_count += 2
-
-                    else:
-                        bit_string.append(n)
-                        byte_count += 1
-
-                    bit_string.append(image[i, j - 1, 0])
-                    bit_string.append(image[i, j - 1, 1])
-                    bit_string.append(image[i, j - 1, 2])
-                    byte_count += 3
-
-                    j = j + 1
-                    n = 0
+        Returns
+        -------
+        statistics : dict
+            'count' of waits and 'mean', 'std', 'min' and 'max' of their
+            jitter in [us], 0 without waits.
 
-                else:
-                    if (j > 1917
-                            or numpy.all(image[i, j + 1, :] ==
-                                         image[i, j + 2, :])
-                            or numpy.all(image[i, j + 1, :] ==
-                                         image[i - 1, j + 1, :])):
-                        bit_string.append(0x01)
-                        byte_count += 1
-                        bit_string.append(image[i, j, 0])
-                        bit_string.append(image[i, j, 1])
-                        bit_string.append(image[i, j, 2])
-                        byte_count += 3
-
-                        j = j + 1
-                        n = 0
-
-                    else:
-                        bit_string.append(0x00)
-                        byte_count += 1
-
-                        toappend = []
-
-                        while (numpy.any(image[i, j, :] != image[i, j + 1, :])
-                               and numpy.any(
-                                        image[i, j, :] != image[i - 1, j, :])
-                               and j < 1919):
-                            n = n + 1
-                            toappend.append(image[i, j, 0])
-                            toappend.append(image[i, j, 1])
-                            toappend.append(image[i, j, 2])
-                            j = j + 1
-
-                        if n >= 128:
-                            byte1 = (n & 0x7f) | 0x80
-                            byte2 = (n >> 7)
-                            bit_string.append(byte1)
-                            bit_string.append(byte2)
-                            byte_count += 2
-
-                        else:
-                            bit_string.append(n)
-                            byte_count += 1
-
-                        for k in toappend:
-                            bit_string.append(k)
-                            byte_count += 1
-                        n = 0
-
-        j = 0
-        i = i + 1
-        bit_string.append(0x00)
-        bit_string.append(0x00)
-        byte_count += 2
+        """
+        jitter = self.jitter(kind)
+        if len(jitter) == 0:
+            return {'count': 0, 'mean': 0.0, 'std': 0.0, 'min': 0.0,
+                    'max': 0.0}
 
-    bit_string.append(0x00)
-    bit_string.append(0x01)
-    bit_string.append(0x00)
-    byte_count += 3
+        return {'count': len(jitter), 'mean': float(jitter.mean()),
+                'std': float(jitter.std()), 'min': float(jitter.min()),
+                'max': float(jitter.max())}
 
-    while (byte_count) % 4 != 0:
-        bit_string.append(0x00)
-        byte_count += 1
+    def reset(self):
+        """
+        Drops the recorded waits and the calibration.
 
-    size = byte_count
+        Returns
+        -------
+        None.
 
-    total = convert_num_to_bit_string(size, 32)
-    total = bits_to_bytes(total)
-    for i in range(len(total)):
-        print(total)
-        bit_string[i + 8] = total[i]
+        """
+        self.records = []
+        self._step_ns = None
+        self.oversleep = None
+        self.oversleep_deviation = None
 
-    return bit_string, byte_count
 
 class DMD():
     """
@@ -317,13 +3413,61 @@ class DMD():
     ----------
     dev : usb class object
             Usb object to communicate with
+    write_size : int
+            Maximum number of bytes written with one call of dev.write, a
+            multiple of the 64 byte report size. Commands longer than one
+            report are sent with as few writes as this allows.
+    bytes_written : int
+            Number of bytes written to the controler.
+    write_seconds : float
+            Time spent in dev.write, in [s].
+    upload_rate : float
+            Bytes per second of the last load_bmp() upload, including the
+            replies of the controler.
+    error_check : str
+            When the commands are checked for errors, one of
+            ERROR_CHECK_POLICIES: 'command' after every command, 'batch'
+            after every error_check_interval commands and at the end of an
+            upload, 'upload' after every command but the upload chunks are
+            checked once at the end, 'off' never.
+    error_check_interval : int
+            Number of commands of a batch with the 'batch' policy.
+    errors : list of tuple
+            The (batch index, error code) of every error found. A batch is
+            the commands sent since the check before.
+    unchecked : int
+            Number of commands sent since the last error check.
+    batch : int
+            Index of the next batch.
+    reply_writes : boolean
+            Request and wait for a reply to every write command. If False,
+            writes are sent without asking for a reply and do not wait for
+            one, errors are still found by the reads of the error checks.
+    sequence : int
+            Sequence byte of the next command. Every command takes the next
+            byte, counted modulo 256, so that a reply can be matched with
+            its command.
+    unanswered : dict
+            Command bytes (com1, com2) of the writes sent without a reply,
+            by their sequence byte.
+    late_replies : list of tuple
+            The (command bytes, reply) of replies the controler sent to
+            writes that did not ask for one.
 
     Methods
     -------
     usb_command()
         Send a command to the controler via usb.
+    send_command()
+        Send a command with the next sequence byte.
+    next_sequence()
+        Return the sequence byte of the next command.
     check_for_errors()
         Check if any error from the controler can be received.
+    command_done()
+        Check for errors after a command, as the error check policy asks.
+    check_pending_errors()
+        Check the commands not checked yet.
     read_reply()
         Read incoming data from the controler via usb.
     idle_on()
@@ -356,10 +3500,17 @@ class DMD():
         Prepare controler for uploading .bmp image.
     load_bmp()
         Upload .bmp image to controler.
+    load_bmp_steps()
+        Upload .bmp image to controler, one chunk per step.
+    upload_frame_steps()
+        Upload .bmp image to a frame of the pattern memory, one chunk per
+        step.
     define_sequence()
         Define a image sequence to display.
     show_image_sequence()
         Starts a image sequence.
+    run_sequence()
+        Shows a image sequence timed by the controller.
     read_status()
         Prints the current status in the console.
     read_firmware()
@@ -403,8 +3554,22 @@ class DMD():
             raise ValueError('Device not found')
         self.dev.set_configuration()
         self.ans = []
-
-    def usb_command(self, mode, byte_sequence, com1, com2, data=None):
+        self.write_size = 64 * _REPORT_SIZE
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+        self.upload_rate = 0.0
+        self.error_check = 'command'
+        self.error_check_interval = 64
+        self.errors = []
+        self.unchecked = 0
+        self.batch = 0
+        self.reply_writes = True
+        self.sequence = 0
+        self.unanswered = {}
+        self.late_replies = []
+
+    def usb_command(self, mode, byte_sequence, com1, com2, data=None,
+                    reply=None):
         """
         USB command function. Sends and receives data/commands via USB.
 
@@ -413,83 +3578,189 @@ class DMD():
         mode : str
             Read or write mode. Choose eiter 'r' (read) or 'w' (write)
         byte_sequence : byte
-            ?.
+            Ignored, the command is sent with the next sequence byte so
+            that its reply can be matched, see send_command().
         com1 : byte
             Command Byte 1.
         com2 : byte
             Command Byte 2.
-        data : byte list, optional
-            Data to write as a list of bytes. The default is None.
+        data : bytes-like or byte list, optional
+            Data to write. The default is None.
+        reply : boolean, optional
+            Request and wait for a reply. Reads always get one. If None,
+            writes ask for one when reply_writes is set. The default is
+            None.
 
         Returns
         -------
-        None.
+        byte_sequence : int
+            Sequence byte the command was sent with.
 
         """
-        buffer = []
-        flag_string = ''
-        if mode == 'r':
-            flag_string += '1'
-        else:
-            flag_string += '0'
-        flag_string += '1000000'
-        buffer.append(bits_to_bytes(flag_string)[0])
-        buffer.append(byte_sequence)
-        temp = bits_to_bytes(convert_num_to_bit_string(len(data) + 2, 16))
-        buffer.append(temp[0])
-        buffer.append(temp[1])
-        buffer.append(com2)
-        buffer.append(com1)
+        return self.send_command(mode, com1, com2, data, reply)
 
-        if len(buffer) + len(data) < 65:
+    def send_command(self, mode, com1, com2, data=None, reply=None):
+        """
+        Sends a command with the next sequence byte, see next_sequence(),
+        and receives the reply.
 
-            for i in range(len(data)):
-                buffer.append(data[i])
+        Parameters
+        ----------
+        mode : str
+            Read or write mode. Choose eiter 'r' (read) or 'w' (write)
+        com1 : byte
+            Command Byte 1.
+        com2 : byte
+            Command Byte 2.
+        data : bytes-like or byte list, optional
+            Data to write. The default is None.
+        reply : boolean, optional
+            Request and wait for a reply. Reads always get one. If None,
+            writes ask for one when reply_writes is set. The default is
+            None.
 
-            for i in range(64 - len(buffer)):
-                buffer.append(0x00)
+        Returns
+        -------
+        byte_sequence : int
+            Sequence byte the command was sent with.
 
-            self.dev.write(1, buffer)
+        """
+        byte_sequence = self.next_sequence()
+        if reply is None:
+            reply = mode == 'r' or self.reply_writes
+        
+        # header and payload, sent in reports of 64 bytes with the last
+        # one padded with zeros; the endpoint splits a longer write into
+        # its reports, so a command takes one write up to write_size
+        packet = command_packet(mode, byte_sequence, com1, com2,
+                                [] if data is None else data, reply)
+        padding = -len(packet) % _REPORT_SIZE
+        if padding:
+            packet += bytes(padding)
+
+        start_time = time.perf_counter()
+        for start in range(0, len(packet), self.write_size):
+            self.dev.write(1, packet[start:start + self.write_size])
+        self.write_seconds += time.perf_counter() - start_time
+        self.bytes_written += len(packet)
+
+        if not reply and mode != 'r':
+            # nothing to wait for, but keep the sequence byte so that a
+            # reply sent anyway can be matched later
+            self.unanswered[byte_sequence] = (com1, com2)
+            return byte_sequence
+
+        # the controler answers with the sequence byte of the command, a
+        # reply with the one of a write sent without reply came late
+        self.ans = self.dev.read(0x81, 64)
+        while (self.ans[1] != byte_sequence
+               and self.ans[1] in self.unanswered):
+            self.late_replies.append((self.unanswered.pop(self.ans[1]),
+                                      self.ans))
+            self.ans = self.dev.read(0x81, 64)
 
-        else:
-            for i in range(64 - len(buffer)):
-                buffer.append(data[i])
+        return byte_sequence
 
-            self.dev.write(1, buffer)
+    def next_sequence(self):
+        """
+        Returns the sequence byte of the next command.
 
-            buffer = []
+        The bytes are counted modulo 256 and the ones of writes still
+        waiting for their reply are skipped, so that a late reply is never
+        taken for the one of a later command. If all of them wait, the
+        oldest one is given up.
 
-            j = 0
-            while j < len(data) - 58:
-                buffer.append(data[j + 58])
-                j = j + 1
-                if j % 64 == 0:
-                    self.dev.write(1, buffer)
+        Returns
+        -------
+        byte_sequence : int
+            The sequence byte.
 
-                    buffer = []
+        """
+        if len(self.unanswered) >= 256:
+            del self.unanswered[next(iter(self.unanswered))]
+        while self.sequence in self.unanswered:
+            self.sequence = (self.sequence + 1) % 256
+        byte_sequence = self.sequence
+        self.sequence = (self.sequence + 1) % 256
 
-            if j % 64 != 0:
+        return byte_sequence
 
-                while j % 64 != 0:
-                    buffer.append(0x00)
-                    j = j + 1
+    def check_for_errors(self):
+        """
+        Check error reports in the DLP module answer.
 
-                self.dev.write(1, buffer)
+        The controler reports the error of the last command that failed, so
+        an error found here belongs to one of the commands of the batch
+        sent since the check before. It is printed and kept in errors with
+        the index of that batch.
 
-        self.ans = self.dev.read(0x81, 64)
+        Returns
+        -------
+        error : int
+            The error code, 0 if there is none.
 
-    def check_for_errors(self):
         """
-        Check error reports in the DLP module answer.
+        self.send_command('r', 0x01, 0x00, [])
+        error = self.ans[6]
+        batch = self.batch
+        self.batch += 1
+        self.unchecked = 0
+        if error != 0:
+            print('error %d in batch %d' % (error, batch))
+            self.errors.append((batch, error))
+
+        return error
+
+    def command_done(self, upload=False):
+        """
+        Count a command sent and check for errors, as the error check policy
+        asks.
+
+        Parameters
+        ----------
+        upload : boolean, optional
+            The command is a chunk of an upload. The default is False.
+
+        Raises
+        ------
+        ValueError
+            If the error check policy is not known.
 
         Returns
         -------
         None.
 
         """
-        self.usb_command('r', 0x22, 0x01, 0x00, [])
-        if self.ans[6] != 0:
-            print(self.ans[6])
+        self.unchecked += 1
+
+        if self.error_check == 'command':
+            self.check_for_errors()
+        elif self.error_check == 'batch':
+            if self.unchecked >= self.error_check_interval:
+                self.check_for_errors()
+        elif self.error_check == 'upload':
+            if not upload:
+                self.check_for_errors()
+        elif self.error_check != 'off':
+            raise ValueError('Unknown error check policy %r, use one of %s.'
+                             % (self.error_check,
+                                ', '.join(ERROR_CHECK_POLICIES)))
+
+    def check_pending_errors(self):
+        """
+        Check the commands sent since the last check, unless error checks
+        are off.
+
+        Returns
+        -------
+        error : int
+            The error code, 0 if there is none or nothing had to be checked.
+
+        """
+        if self.unchecked and self.error_check != 'off':
+            return self.check_for_errors()
+
+        return 0
 
     def read_reply(self):
         """
@@ -513,8 +3784,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x02, 0x01, [int('00000001', 2)])
-        self.check_for_errors()
+        self.send_command('w', 0x02, 0x01, [int('00000001', 2)])
+        self.command_done()
 
     def idle_off(self):
         """
@@ -525,8 +3796,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x02, 0x01, [int('00000000', 2)])
-        self.check_for_errors()
+        self.send_command('w', 0x02, 0x01, [int('00000000', 2)])
+        self.command_done()
 
     def stand_by(self):
         """
@@ -537,8 +3808,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x02, 0x00, [int('00000001', 2)])
-        self.check_for_errors()
+        self.send_command('w', 0x02, 0x00, [int('00000001', 2)])
+        self.command_done()
 
     def wake_up(self):
         """
@@ -549,8 +3820,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x02, 0x00, [int('00000000', 2)])
-        self.check_for_errors()
+        self.send_command('w', 0x02, 0x00, [int('00000000', 2)])
+        self.command_done()
 
     def reset(self):
         """
@@ -561,7 +3832,7 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x02, 0x00, [int('00000010', 2)])
+        self.send_command('w', 0x02, 0x00, [int('00000010', 2)])
         self.read_reply()
 
     def test_read(self):
@@ -573,7 +3844,7 @@ class DMD():
         None.
 
         """
-        self.usb_command('r', 0xff, 0x11, 0x00, [])
+        self.send_command('r', 0x11, 0x00, [])
         self.read_reply()
 
     def test_write(self):
@@ -585,9 +3856,9 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x22, 0x11, 0x00,
+        self.send_command('w', 0x11, 0x00,
                          [0xff, 0x01, 0xff, 0x01, 0xff, 0x01])
-        self.check_for_errors()
+        self.command_done()
 
     def change_mode(self, mode):
         """
@@ -609,8 +3880,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x1a, 0x1b, [mode])
-        self.check_for_errors()
+        self.send_command('w', 0x1a, 0x1b, [mode])
+        self.command_done()
 
     def start_sequence(self):
         """
@@ -621,8 +3892,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x1a, 0x24, [2])
-        self.check_for_errors()
+        self.send_command('w', 0x1a, 0x24, [2])
+        self.command_done()
 
     def pause_sequence(self):
         """
@@ -633,8 +3904,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x1a, 0x24, [1])
-        self.check_for_errors()
+        self.send_command('w', 0x1a, 0x24, [1])
+        self.command_done()
 
     def stop_sequence(self):
         """
@@ -645,8 +3916,8 @@ class DMD():
         None.
 
         """
-        self.usb_command('w', 0x00, 0x1a, 0x24, [0])
-        self.check_for_errors()
+        self.send_command('w', 0x1a, 0x24, [0])
+        self.command_done()
 
     def configure_lut(self, image_number, repetition_number):
         """
@@ -667,15 +3938,10 @@ class DMD():
         None.
 
         """
-        img = convert_num_to_bit_string(image_number, 11)
-        repeat = convert_num_to_bit_string(repetition_number, 32)
-
-        string = repeat + '00000' + img
+        payload = lut_payload(image_number, repetition_number)
 
-        bytes = bits_to_bytes(string)
-
-        self.usb_command('w', 0x00, 0x1a, 0x31, bytes)
-        self.check_for_errors()
+        self.send_command('w', 0x1a, 0x31, payload)
+        self.command_done()
 
     def define_pattern(self, index, exposure, bit_depth, color, trigger_in,
                        dark_time, trigger_out, pat_ind, bit_pos):
@@ -714,51 +3980,12 @@ class DMD():
 
         """
         print('def pattern')
-        payload = []
-        index = convert_num_to_bit_string(index, 16)
-        index = bits_to_bytes(index)
-        for i in range(len(index)):
-            payload.append(index[i])
-
-        exposure = convert_num_to_bit_string(exposure, 24)
-        exposure = bits_to_bytes(exposure)
-
-        for i in range(len(exposure)):
-            payload.append(exposure[i])
-
-        options_byte = ''
-        options_byte += '1'
-        bit_depth = convert_num_to_bit_string(bit_depth - 1, 3)
-        options_byte = bit_depth + options_byte
-        options_byte = color + options_byte
-
-        if trigger_in:
-            options_byte = '1' + options_byte
-        else:
-            options_byte = '0' + options_byte
-
-        payload.append(bits_to_bytes(options_byte)[0])
-
-        dark_time = convert_num_to_bit_string(dark_time, 24)
-        dark_time = bits_to_bytes(dark_time)
-
-        for i in range(len(dark_time)):
-            payload.append(dark_time[i])
-
-        trigger_out = convert_num_to_bit_string(trigger_out, 8)
-        trigger_out = bits_to_bytes(trigger_out)
-        payload.append(trigger_out[0])
-
-        pat_ind = convert_num_to_bit_string(pat_ind, 11)
-        bit_pos = convert_num_to_bit_string(bit_pos, 5)
-        last_bits = bit_pos + pat_ind
-        last_bits = bits_to_bytes(last_bits)
-
-        for i in range(len(last_bits)):
-            payload.append(last_bits[i])
+        payload = pattern_payload(index, exposure, bit_depth, color,
+                                  trigger_in, dark_time, trigger_out,
+                                  pat_ind, bit_pos)
             
-        self.usb_command('w', 0x00, 0x1a, 0x34, payload)
-        self.check_for_errors()    
+        self.send_command('w', 0x1a, 0x34, payload)
+        self.command_done()    
             
         return payload
 
@@ -779,21 +4006,10 @@ class DMD():
         None.
 
         """
-        payload = []
+        payload = bmp_index_payload(index, size)
 
-        index = convert_num_to_bit_string(index, 5)
-        index = '0' * 11 + index
-        index = bits_to_bytes(index)
-        for i in range(len(index)):
-            payload.append(index[i])
-
-        total = convert_num_to_bit_string(size, 32)
-        total = bits_to_bytes(total)
-        for i in range(len(total)):
-            payload.append(total[i])
-
-        self.usb_command('w', 0x00, 0x1a, 0x2a, payload)
-        self.check_for_errors()
+        self.send_command('w', 0x1a, 0x2a, payload)
+        self.command_done()
 
     def load_bmp(self, image, size, debug=True):
         """
@@ -805,25 +4021,51 @@ class DMD():
 
         Parameters
         ----------
-        image : str numpy array
-            Numpy array representing the image. Bit depth 8. As bit string due
-            to encoding beforehand.
+        image : bytes-like, numpy array or list
+            The encoded image, e.g. as returned by encode() or a frame of a
+            SequenceFile. The chunks are sent as slices of it, without
+            copying the image byte by byte.
         size : int
             Number of bytes of the image.
         debug : boolean, optional
-            If True, than debug messages will be displayed in the console.
-            The default is False.
+            If True, than debug messages and the upload rate will be
+            displayed in the console. The default is False.
 
         Returns
         -------
         None.
 
         """
-        
+        for chunk_index in self.load_bmp_steps(image, size, debug):
+            pass
+
+    def load_bmp_steps(self, image, size, debug=True):
+        """
+        Upload a .bmp image chunk by chunk, as load_bmp() does, yielding
+        after every chunk so that other commands can be sent in between
+        (see DMDExecutor).
+
+        Parameters
+        ----------
+        image : bytes-like, numpy array or list
+            The encoded image, as for load_bmp().
+        size : int
+            Number of bytes of the image.
+        debug : boolean, optional
+            If True, than debug messages and the upload rate will be
+            displayed in the console. The default is False.
+
+        Yields
+        ------
+        chunk_index : int
+            Index of the chunk sent.
+
+        """
+        image = as_buffer(image)
         size = len(image)
         pack_num = int(size / 504 + 1)
-
-        counter = 0
+        
+        start_time = time.perf_counter()
 
         for i in range(pack_num):
             
@@ -832,45 +4074,161 @@ class DMD():
                 if debug:
                     print(i, pack_num)
 
-            payload = []
+            # the slice stops at the end of the image, so the last chunk
+            # holds the remaining size % 504 bytes
+            chunk = image[i * 504:(i + 1) * 504]
+            payload = struct.pack('<H', len(chunk)) + chunk
 
-            if i < pack_num - 1:
-                leng = convert_num_to_bit_string(504, 16)
-                bits = 504
-            else:
-                leng = convert_num_to_bit_string(size % 504, 16)
-                bits = size % 504
+            self.send_command('w', 0x1a, 0x2b, payload)
+            self.command_done(upload=True)
+            
+            yield i
+        
+        # the chunks of a deferred check are checked at the end
+        self.check_pending_errors()
+            
+        # effective rate of the upload, to compare with the rate the usb
+        # endpoint can take at most
+        self.upload_rate = size / max(time.perf_counter() - start_time, 1e-9)
+        if debug:
+            print('uploaded %d bytes, %.0f bytes/s (%.0f%% of the usb limit)'
+                  % (size, self.upload_rate,
+                     100.0 * self.upload_rate / HID_BYTES_PER_SECOND))
+
+    def upload_frame_steps(self, image, index=0):
+        """
+        Upload an encoded image to a frame of the pattern memory, set_bmp()
+        and then one chunk per step.
+
+        Parameters
+        ----------
+        image : bytes-like, numpy array or list
+            The encoded image, as for load_bmp().
+        index : int, optional
+            Index of the frame in the pattern memory. The default is 0.
 
-            leng = bits_to_bytes(leng)
+        Yields
+        ------
+        chunk_index : int
+            Index of the chunk sent.
 
-            for j in range(2):
-                payload.append(leng[j])
+        """
+        image = as_buffer(image)
+        self.set_bmp(index, len(image))
+        yield from self.load_bmp_steps(image, len(image), False)
 
-            for j in range(bits):
+    def upload_frames(self, frames, processes=None, cache=None,
+                      compression='erle', merge=merge_images,
+                      queue_depth=4, check=False):
+        """
+        Merge, encode and upload frames to the pattern memory.
 
-                """
-                This if statement blocks the index counter if it gets too
-                big.
-                """
-                
-                if counter < len(image):
-                    payload.append(image[counter])
+        The frames are encoded on worker processes while the already
+        encoded ones are uploaded, so the whole takes about as long as the
+        slower of the two instead of their sum. The frames are uploaded
+        from the last one to the first one.
 
-                counter += 1
+        Parameters
+        ----------
+        frames : list
+            One entry per frame, passed to the merge function.
+        processes : int, optional
+            Number of worker processes used to merge and encode the frames.
+            If None, one process per CPU is used. With 1 nothing overlaps
+            the upload. The default is None.
+        cache : EncodingCache, optional
+            Cache of encoded images. Frames found in it are not encoded
+            again. The default is None.
+        compression : str, optional
+            Compression of the frames, as for define_sequence(). The
+            default is 'erle'.
+        merge : function, optional
+            Function merging the entries of a frame, as for
+            encode_frames(). The default is merge_images().
+        queue_depth : int, optional
+            Number of encoded frames buffered ahead of the upload, on top
+            of the one every worker encodes, see encode_frames(). The
+            default is 4.
+        check : boolean, optional
+            Preflight: every frame is decoded on its worker and compared
+            with the merged frame before it is uploaded, see verify(). It
+            runs next to the upload, which is the slower part. The default
+            is False.
 
-            self.usb_command('w', 0x11, 0x1a, 0x2b, payload)
-            self.check_for_errors()
+        Raises
+        ------
+        ValueError
+            If check is set and a frame does not decode back to its merged
+            image. The frames before it are uploaded already.
+
+        Returns
+        -------
+        sizes : list of int
+            Number of bytes of every encoded frame.
+
+        """
+        order = list(reversed(range(len(frames))))
+        sizes = [0] * len(frames)
+        upload_seconds = 0.0
+
+        start = time.perf_counter()
 
+        print('merging, encoding and uploading...')
+
+        encoding = encode_frames([frames[i] for i in order], processes,
+                                 cache, compression, merge, queue_depth,
+                                 check)
+
+        for i, (image_data, size) in zip(order, encoding):
+            sizes[i] = size
+
+            print('frame %d: %s, %d bytes'
+                  % (i, encoded_compression(image_data), size))
+
+            upload_start = time.perf_counter()
+
+            self.set_bmp(i, size)
+            self.load_bmp(image_data, size)
+
+            upload_seconds += time.perf_counter() - upload_start
+
+        print('%d frames, %d bytes in %.2f s, %.2f s of it uploading'
+              % (len(sizes), sum(sizes), time.perf_counter() - start,
+                 upload_seconds))
+
+        return sizes
+
+    def _report_deduplication(self, count, distinct, frames_without, sizes):
+        """
+        Prints the encoded bytes and the upload time saved by uploading
+        every distinct image once. The frames without deduplication are
+        not encoded, their bytes are estimated from the mean size of the
+        uploaded frames and their upload time from upload_rate.
+        """
+        after = sum(sizes)
+        before = after * frames_without // max(len(sizes), 1)
+        print('%d images, %d distinct: %d encoded bytes uploaded instead of '
+              'about %d, %.2f s less upload'
+              % (count, distinct, after, before,
+                 (before - after) / max(self.upload_rate, 1.0)))
 
     def define_sequence(self, images, exposure, trigger_in, dark_time,
-                        trigger_out, repetition_number):
+                        trigger_out, repetition_number, processes=None,
+                        cache=None, compression='erle',
+                        grouping='sequential', queue_depth=4, check=False):
         """
         Define a sequence of images to display.
 
+        Every plane gets a look up table entry as a 1 bit pattern, its bit
+        position pointing at its bit of the frame. The entries used to be
+        8 bit patterns, which the controller only addresses by the bit
+        positions 0, 1 and 2, not 0 to 23.
+
         Parameters
         ----------
         images : int numpy array
-            Numpy array containing the image information. Bit depth is 8.
+            Numpy array containing the bit planes to display, 24 of them are
+            merged into every frame.
         exposure : int numpy array
             Exposure time values in a numpy array in [us].
         trigger_in : boolean numpy array
@@ -884,6 +4242,35 @@ class DMD():
         repetition_number : int
             Value defininf how often the image sequence is repeated. Set this
             value to 0 for an infinit loop.
+        processes : int, optional
+            Number of worker processes used to merge and encode the frames.
+            If None, one process per CPU is used. The default is None.
+        cache : EncodingCache, optional
+            Cache of encoded images. Frames found in it are not encoded
+            again. The default is None.
+        compression : str, optional
+            Compression of the frames, 'erle', 'rle', 'uncompressed' or
+            'auto' to pick the smallest one frame by frame. The default is
+            'erle'.
+        grouping : str, optional
+            How the planes are put in frames, 'sequential' takes them 24 by
+            24 in display order, 'similar' groups alike planes together
+            (see group_bit_planes()) for smaller frames. With 'similar' the
+            sequential frames are encoded as well, to report the bytes
+            saved, which takes the time of a second encoding. The default
+            is 'sequential'.
+        queue_depth : int, optional
+            Number of encoded frames buffered ahead of the upload, see
+            upload_frames(). The default is 4.
+        check : boolean, optional
+            Preflight every frame before it is uploaded, see
+            upload_frames(). The default is False.
+
+        Raises
+        ------
+        ValueError
+            If the grouping is not known, or if check is set and a frame
+            does not decode back to its merged image.
 
         Returns
         -------
@@ -900,62 +4287,216 @@ class DMD():
 
         num = len(arr)
 
-        encoded_images = []
-        sizes = []
+        # a plane shown more than once is only put in one frame
+        first, index = deduplicate_images(arr)
+        distinct = [arr[j] for j in first]
 
-        for i in range(int((num - 1) / 24 + 1)):
-            print('merging...')
+        sequential = [distinct[i:i + 24] for i in range(0, len(distinct), 24)]
 
-            if i < ((num - 1) / 24):
-                image_data = merge_images(arr[i * 24:(i + 1) * 24])
-            else:
-                image_data = merge_images(arr[i * 24:])
+        if grouping == 'sequential':
+            frames = sequential
+            positions = [(j // 24, j % 24) for j in range(len(distinct))]
+        elif grouping == 'similar':
+            frames, positions = group_bit_planes(distinct)
+        else:
+            raise ValueError('Unknown grouping %r, use sequential or similar.'
+                             % (grouping,))
 
-            print('encoding...')
-            image_data, size = encode(image_data)
+        positions = [positions[k] for k in index]
 
-            encoded_images.append(image_data)
-            sizes.append(size)
+        print('%d planes, %d distinct: uploading %d frames instead of %d'
+              % (num, len(distinct), len(frames), (num + 23) // 24))
 
-            if i < ((num - 1) / 24):
-                for j in range(i * 24, (i + 1) * 24):
-                    self.define_pattern(j, exposure[j], 8, '100',
-                                        trigger_in[j], dark_time[j],
-                                        trigger_out[j], i, j - i * 24)
-            else:
-                for j in range(i * 24, num):
-                    self.define_pattern(j, exposure[j], 8, '100',
-                                        trigger_in[j], dark_time[j],
-                                        trigger_out[j], i, j - i * 24)
+        # the planes are 1 bit patterns, the bit position counts planes
+        for j, (frame, bit_pos) in enumerate(positions):
+            self.define_pattern(j, exposure[j], 1, '100', trigger_in[j],
+                                dark_time[j], trigger_out[j], frame, bit_pos)
 
         self.configure_lut(num, repetition_number)
 
-        for i in range(int((num - 1) / 24 + 1)):
-            
-            self.set_bmp(int((num - 1) / 24 - i),
-                         sizes[int((num - 1) / 24 - i)])
+        sizes = self.upload_frames(frames, processes, cache, compression,
+                                   merge_images, queue_depth, check)
+        self._report_deduplication(num, len(distinct), (num + 23) // 24,
+                                   sizes)
+
+        if grouping == 'similar':
+            # the encoded bytes of the same planes taken 24 by 24
+            before = sum(size for image_data, size in
+                         encode_frames(sequential, processes, cache,
+                                       compression))
+            after = sum(sizes)
+            print('grouped by similarity: %d encoded bytes instead of %d '
+                  '(%.1f%% less)'
+                  % (after, before, 100.0 * (before - after) / max(before, 1)))
+
+    def define_greyscale_sequence(self, images, exposure, trigger_in,
+                                  dark_time, trigger_out, repetition_number,
+                                  processes=None, cache=None,
+                                  compression='erle', queue_depth=4,
+                                  check=False):
+        """
+        Define a sequence of 8 bit greyscale images to display.
+
+        Three consecutive images share one 24 bit frame, each in its own
+        byte (see merge_greyscale_images()), and the patterns point to
+        their byte by the bit position. Only a third of the frames have
+        to be uploaded compared to one frame per image.
+
+        Parameters
+        ----------
+        images : list of numpy array 2D
+            Greyscale images of shape (1080, 1920), bit depth 8.
+        exposure : int numpy array
+            Exposure time values in a numpy array in [us].
+        trigger_in : boolean numpy array
+            Numpy array of boolean values determine wheter to wait for an
+            external Trigger before exposure.
+        dark_time : int numpy array
+            Numpy array containing dark time values in [us].
+        trigger_out : boolean numpy array
+            Numpy array of boolean values determine wheter to wait for an
+            external Trigger after exposure.
+        repetition_number : int
+            Value defininf how often the image sequence is repeated. Set this
+            value to 0 for an infinit loop.
+        processes : int, optional
+            Number of worker processes used to merge and encode the frames.
+            If None, one process per CPU is used. The default is None.
+        cache : EncodingCache, optional
+            Cache of encoded images. Frames found in it are not encoded
+            again. The default is None.
+        compression : str, optional
+            Compression of the frames, as for define_sequence(). The
+            default is 'erle'.
+        queue_depth : int, optional
+            Number of encoded frames buffered ahead of the upload, see
+            upload_frames(). The default is 4.
+        check : boolean, optional
+            Preflight every frame before it is uploaded, see
+            upload_frames(). The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stop_sequence()
+
+        images = list(images)
+
+        # an image shown more than once is only put in one frame
+        first, index = deduplicate_images(images)
+        frames, positions = greyscale_frames([images[j] for j in first])
+        positions = [positions[k] for k in index]
+
+        print('%d images, %d distinct: uploading %d frames instead of %d'
+              % (len(images), len(first), len(frames),
+                 (len(images) + 2) // 3))
+
+        for j, (frame, bit_pos) in enumerate(positions):
+            self.define_pattern(j, exposure[j], 8, '100', trigger_in[j],
+                                dark_time[j], trigger_out[j], frame, bit_pos)
+
+        self.configure_lut(len(positions), repetition_number)
+
+        sizes = self.upload_frames(frames, processes, cache, compression,
+                                   merge_greyscale_images, queue_depth, check)
+        self._report_deduplication(len(images), len(first),
+                                   (len(images) + 2) // 3, sizes)
+
+    def define_pattern_sequence(self, images, bit_depths, exposure,
+                                trigger_in, dark_time, trigger_out,
+                                repetition_number, processes=None,
+                                cache=None, compression='erle',
+                                queue_depth=4, check=False):
+        """
+        Define a sequence of patterns of mixed bit depth to display.
+
+        The patterns are packed in as few 24 bit frames as their bit depths
+        allow (see pack_patterns()), the look up table still shows them in
+        the given order.
+
+        Parameters
+        ----------
+        images : list of numpy array 2D
+            Patterns of shape (1080, 1920), a pattern of bit depth n holds
+            values from 0 to 2**n - 1.
+        bit_depths : list of int
+            Bit depth of every pattern, 1, 2, 4, 6, 7 or 8.
+        exposure : int numpy array
+            Exposure time values in a numpy array in [us].
+        trigger_in : boolean numpy array
+            Numpy array of boolean values determine wheter to wait for an
+            external Trigger before exposure.
+        dark_time : int numpy array
+            Numpy array containing dark time values in [us].
+        trigger_out : boolean numpy array
+            Numpy array of boolean values determine wheter to wait for an
+            external Trigger after exposure.
+        repetition_number : int
+            Value defininf how often the image sequence is repeated. Set this
+            value to 0 for an infinit loop.
+        processes : int, optional
+            Number of worker processes used to merge and encode the frames.
+            If None, one process per CPU is used. The default is None.
+        cache : EncodingCache, optional
+            Cache of encoded images. Frames found in it are not encoded
+            again. The default is None.
+        compression : str, optional
+            Compression of the frames, as for define_sequence(). The
+            default is 'erle'.
+        queue_depth : int, optional
+            Number of encoded frames buffered ahead of the upload, see
+            upload_frames(). The default is 4.
+        check : boolean, optional
+            Preflight every frame before it is uploaded, see
+            upload_frames(). The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.stop_sequence()
+
+        images = list(images)
+
+        # a pattern shown more than once is only put in one frame
+        first, index = deduplicate_images(images, bit_depths)
+        frames, positions = pack_patterns([images[j] for j in first],
+                                          [bit_depths[j] for j in first])
+        positions = [positions[k] for k in index]
+        frames_without = len(pack_patterns(images, bit_depths)[0])
+
+        print('packed %d patterns, %d distinct, in %d frames instead of %d'
+              % (len(positions), len(first), len(frames), frames_without))
+
+        for j, (frame, bit_pos) in enumerate(positions):
+            self.define_pattern(j, exposure[j], int(bit_depths[j]), '100',
+                                trigger_in[j], dark_time[j], trigger_out[j],
+                                frame, bit_pos)
 
-            print('uploading...')
+        self.configure_lut(len(positions), repetition_number)
 
-            """
-            Seems like that the size index is too big. This results
-            in a error in the bmpload() function.
-            A if statement in the bmpload() function was implemented.
-            This if statement blocks index, that is too long!
-            """
+        sizes = self.upload_frames(frames, processes, cache, compression,
+                                   merge_patterns, queue_depth, check)
+        self._report_deduplication(len(images), len(first), frames_without,
+                                   sizes)
 
-            self.load_bmp(encoded_images[int((num - 1) / 24 - i)],
-                          sizes[int((num - 1) / 24 - i)])
-            
     def show_image_sequence(self, encoding, brightness, exposures, dark_times,
-                              trigger_ins, trigger_outs, debug=False):
+                              trigger_ins, trigger_outs, debug=False,
+                              cache=None, compression='erle', positions=None,
+                              bit_depths=None, pipelined=False, timer=None):
         """
         Start imae sequence.
 
         Parameters
         ----------
         encoding : list
-            List containing the encoded image data of each image.
+            List containing the encoded image data of each image, or of each
+            frame if positions is given. An entry can also be a merged image
+            (numpy array of shape (1080,1920,3)), which is then encoded
+            before the sequence starts.
         brightness : list
             List containing the broghtness data of each image.
         exposures : list
@@ -968,6 +4509,33 @@ class DMD():
             List containing if we use output trigger for each image.
         debug : str, optional
             Prints debug messages in the console. The default is False.
+        cache : EncodingCache, optional
+            Cache used to encode merged images given in encoding. The default
+            is None.
+        compression : str, optional
+            Compression used to encode merged images given in encoding, as
+            for encode(). The default is 'erle'.
+        positions : list of tuple, optional
+            Per image the index of its frame in encoding and its bit
+            position, as returned by greyscale_frames() or pack_patterns().
+            All frames are then uploaded once before the first image, and
+            every image is shown by pointing the pattern at its frame and
+            bits, images that repeat share their position. If None,
+            encoding holds one frame per image. The default is None.
+        bit_depths : list of int, optional
+            Bit depth of every image, used with positions. If None, all
+            images are 8 bit. The default is None.
+        pipelined : boolean, optional
+            Without positions, upload the frame of the next image to the
+            second frame of the pattern memory while the current one is
+            exposed and dark, one chunk at a time, so that only a few
+            commands are left between two exposures. A chunk is only sent
+            while the one before would still fit in the exposure or dark
+            time. The default is False.
+        timer : FrameTimer, optional
+            Times the exposures and dark times and records their jitter.
+            If None, a FrameTimer with the default spin threshold is used.
+            The default is None.
 
         Returns
         -------
@@ -975,24 +4543,56 @@ class DMD():
 
         """
         
+        # encode merged images up front, served from the cache if possible
+        encoding = list(encoding)
+        for index, enc in enumerate(encoding):
+            if isinstance(enc, numpy.ndarray):
+                if cache is None:
+                    encoding[index] = encode(enc, compression)[0]
+                else:
+                    encoding[index] = cache.encode(enc, compression)[0]
+        
         # stop any already existing sequence
         self.stop_sequence()
         self.set_led_pwm(0)
         self.idle_off()
         self.change_mode(3)
         
-        for index, enc in enumerate(encoding):
+        if bit_depths is None:
+            bit_depths = [8] * len(exposures)
+        
+        if timer is None:
+            timer = FrameTimer()
+        
+        # chunks of the frame uploaded in the background, when pipelined
+        upload = None
+        
+        if positions is None and pipelined:
+            positions = [(index, None) for index in range(len(encoding))]
             
-            for j in range(0,2,1):
-                self.define_pattern(index, exposures[index], 8, '100',
+            # the first frame goes to the first slot, the others are
+            # uploaded while the image before is shown
+            upload = self.upload_frame_steps(encoding[0], 0)
+        elif positions is None:
+            positions = [(index, None) for index in range(len(encoding))]
+            
+            for index, enc in enumerate(encoding):
+                
+                for j in range(0,2,1):
+                    self.define_pattern(index, exposures[index], 8, '100',
                                         trigger_ins[index], dark_times[index],
                                         trigger_outs[index], j, j)
+        else:
+            # upload every frame once, the patterns point at the frame and
+            # bits of their image, so images shown again need no upload
+            for frame in reversed(range(len(encoding))):
+                self.set_bmp(frame, len(encoding[frame]))
                 
+                self.load_bmp(encoding[frame], len(encoding[frame]))
         
-        for index, enc in enumerate(encoding):
+        for index, (frame, bit_pos) in enumerate(positions):
             
-            display_time = 0
-            wait_time = 0
+            enc = encoding[frame]
             
             if debug:
                 print("- DEBUG PARAMETERS -")
@@ -1004,37 +4604,52 @@ class DMD():
                 print('\n trigger in: %s' %  trigger_ins[index])
                 print('\n trigger out: %s' % trigger_outs[index])
                 
-            self.configure_lut(len(encoding), 1)
-            
-            self.set_bmp(0, len(enc))
-            
-            self.load_bmp(enc,len(enc))
+            if bit_pos is None and pipelined:
+                # finish the upload of this frame, then start the one of
+                # the next frame into the other slot
+                if upload is not None:
+                    for chunk_index in upload:
+                        pass
+                
+                self.define_pattern(0, exposures[index], bit_depths[index],
+                                    '100', trigger_ins[index],
+                                    dark_times[index], trigger_outs[index],
+                                    index % 2, 0)
+                self.configure_lut(1, 1)
+                
+                upload = None
+                if index + 1 < len(encoding):
+                    upload = self.upload_frame_steps(encoding[index + 1],
+                                                     (index + 1) % 2)
+            elif bit_pos is None:
+                self.configure_lut(len(encoding), 1)
+                
+                self.set_bmp(0, len(enc))
+                
+                self.load_bmp(enc,len(enc))
+            else:
+                # point the pattern to the frame and bits of this image
+                self.define_pattern(0, exposures[index], bit_depths[index],
+                                    '100', trigger_ins[index],
+                                    dark_times[index], trigger_outs[index],
+                                    frame, bit_pos)
+                self.configure_lut(1, 1)
             
             self.set_led_pwm(brightness[index])
             
             self.start_sequence()
             
-            st = time.clock();
-            
-            while display_time <= exposures[index]:
-                display_time = (time.clock()-st)*1e6
+            # send chunks of the next frame instead of only waiting
+            display_time, upload = timer.wait(exposures[index], work=upload,
+                                              index=index, kind='exposure')
 
             self.set_led_pwm(0)
             self.stop_sequence()
             
-            start_time = time.process_time()*1e6
-            
-            if dark_times[index] > 0:
-                while wait_time <= dark_times[index]:
-                    wait_time = time.process_time()*1e6 - start_time
-                    #print(wait_time)
+            wait_time, upload = timer.wait(dark_times[index], work=upload,
+                                           index=index, kind='dark')
             
             self.stop_sequence()
-        
-            start_time = time.process_time()*1e6
-            
-            while wait_time <= dark_times[index]:
-                wait_time = time.process_time()*1e6 - start_time
             
             if debug:
                 print("\n- DISPLAY IMAGE -")
@@ -1046,6 +4661,133 @@ class DMD():
         self.stop_sequence()
         self.set_led_pwm(0)
         
+        if debug:
+            for kind in ('exposure', 'dark'):
+                statistics = timer.statistics(kind)
+                print('%s jitter [us]: mean %.1f, std %.1f, max %.1f'
+                      % (kind, statistics['mean'], statistics['std'],
+                         statistics['max']))
+        
+    def run_sequence(self, encoding, brightness, exposures, dark_times,
+                     trigger_ins, trigger_outs, positions=None,
+                     bit_depths=None, repetition_number=1, margin=20000):
+        """
+        Show an image sequence timed by the controller.
+
+        All frames are uploaded once, then the look up table gets an entry
+        with the exposure and dark time of every image and the controller
+        steps through them on its own, so neither the uploads nor the host
+        timing end up between the exposures. The LED brightness is set by
+        the host, the images are therefore shown in segments of equal
+        brightness (see brightness_segments()), a sequence of one
+        brightness is one segment.
+
+        The host does not see when the controller finished a segment, it
+        waits for the exposures and dark times of the segment and the
+        margin. An image waiting for its input trigger takes as long as the
+        trigger needs, so a sequence with input triggers can only be one
+        segment; this method then returns once it started, like an endless
+        one.
+
+        Parameters
+        ----------
+        encoding : list
+            List containing the encoded frames.
+        brightness : list
+            List containing the brightness of each image.
+        exposures : list
+            List containing the exposure time in [us] of each image.
+        dark_times : list
+            List containing the dark time in [us] of each image.
+        trigger_ins : list
+            List containing if we use input trigger for each image.
+        trigger_outs : list
+            List containing if we use output trigger for each image.
+        positions : list of tuple, optional
+            Per image the index of its frame in encoding and its bit
+            position, as returned by pack_patterns(). If None, every image
+            is the 8 bit frame of the same index. The default is None.
+        bit_depths : list of int, optional
+            Bit depth of every image. If None, all images are 8 bit. The
+            default is None.
+        repetition_number : int, optional
+            How often the sequence is shown. With 0 a sequence of one
+            brightness is shown until stop_sequence() is called, this method
+            then returns once it started. The default is 1.
+        margin : int, optional
+            Time in [us] waited after every segment on top of its exposures
+            and dark times, for the start of the segment and the oversleep
+            of the host. The default is 20000.
+
+        Raises
+        ------
+        ValueError
+            If a sequence of several brightness segments should be shown
+            endlessly or with input triggers.
+
+        Returns
+        -------
+        None.
+
+        """
+        if positions is None:
+            positions = [(index, 0) for index in range(len(encoding))]
+        if bit_depths is None:
+            bit_depths = [8] * len(positions)
+
+        segments = brightness_segments(brightness)
+        if repetition_number == 0 and len(segments) > 1:
+            raise ValueError('Only a sequence of one brightness can be '
+                             'repeated endlessly, this one has %d segments.'
+                             % len(segments))
+        if len(segments) > 1 and any(trigger_ins):
+            raise ValueError('A sequence with input triggers can only be of '
+                             'one brightness, this one has %d segments.'
+                             % len(segments))
+
+        # stop any already existing sequence
+        self.stop_sequence()
+        self.set_led_pwm(0)
+        self.idle_off()
+        self.change_mode(3)
+
+        for frame in reversed(range(len(encoding))):
+            self.set_bmp(frame, len(encoding[frame]))
+
+            self.load_bmp(encoding[frame], len(encoding[frame]), False)
+
+        if len(segments) == 1:
+            # the controller repeats the whole sequence itself
+            repeats, lut_repetitions = 1, repetition_number
+        else:
+            repeats, lut_repetitions = repetition_number, 1
+
+        for repeat in range(repeats):
+            for start, stop in segments:
+                for j in range(start, stop):
+                    frame, bit_pos = positions[j]
+                    self.define_pattern(j - start, exposures[j],
+                                        bit_depths[j], '100', trigger_ins[j],
+                                        dark_times[j], trigger_outs[j],
+                                        frame, bit_pos)
+
+                self.configure_lut(stop - start, lut_repetitions)
+
+                self.set_led_pwm(brightness[start])
+                self.start_sequence()
+
+                if lut_repetitions == 0 or any(trigger_ins):
+                    return
+
+                # the controller times the segment, the host only waits for
+                # its end to change the brightness
+                duration = sum(exposures[j] + dark_times[j]
+                               for j in range(start, stop))
+                time.sleep((duration * lut_repetitions + margin) * 1e-6)
+
+                self.set_led_pwm(0)
+                self.stop_sequence()
+
     def read_status(self):
         """
         Prints the current status in the console. Check the DLPC900 Programming
@@ -1057,7 +4799,7 @@ class DMD():
         None.
 
         """
-        self.usb_command('r', 0xff, 0x00, 0x00, [])
+        self.send_command('r', 0x00, 0x00, [])
         self.read_reply()
         
     def read_firmware(self):
@@ -1072,7 +4814,7 @@ class DMD():
         None.
 
         """
-        self.usb_command('r', 0xff, 0x02, 0x06, [])
+        self.send_command('r', 0x02, 0x06, [])
         self.read_reply()
         
     def set_led_pwm(self, current_pwm, enable_disable='enable',
@@ -1131,7 +4873,7 @@ class DMD():
         else:
             print('No valid input. Choose either "enable" or "disable".')
             
-        self.usb_command('w', 0xff, 0x1A, 0x07, [payload])
+        self.send_command('w', 0x1A, 0x07, [payload])
         
     def set_led_pwm_polarity(self, pwm_polarity):
         """
@@ -1156,7 +4898,7 @@ class DMD():
         else:
             print('No valid input. Choose either "normal" or "invert".')
             
-        self.usb_command('w', 0xff, 0x1A, 0x05, [payload])
+        self.send_command('w', 0x1A, 0x05, [payload])
         
     def set_led_driver_current(self, current_pwm):
         """
@@ -1176,7 +4918,7 @@ class DMD():
         """
         # in the following order: red, green, blue
         payload =  [0x00, 0x00, current_pwm]
-        self.usb_command('w', 0xff, 0x0B, 0x01, payload)
+        self.send_command('w', 0x0B, 0x01, payload)
         
     def long_axis_image_flip(self):
         """
@@ -1188,7 +4930,7 @@ class DMD():
         None.
         """
         payload = 0b00000001
-        self.usb_command('w', 0xff, 0x10, 0x08, [payload])
+        self.send_command('w', 0x10, 0x08, [payload])
         
     def short_axis_image_flip(self):
         """
@@ -1200,7 +4942,7 @@ class DMD():
         None.
         """
         payload = 0b00000001
-        self.usb_command('w', 0xff, 0x10, 0x09, [payload])
+        self.send_command('w', 0x10, 0x09, [payload])
         
     def dmd_park(self):
         """
@@ -1216,7 +4958,7 @@ class DMD():
         """
         self.stop_sequence()
         payload = 0b00000001
-        self.usb_command('w', 0xff, 0x06, 0x09, [payload])
+        self.send_command('w', 0x06, 0x09, [payload])
         
     def dmd_unpark(self):
         """
@@ -1228,7 +4970,7 @@ class DMD():
 
         """
         payload = 0b00000000
-        self.usb_command('w', 0xff, 0x06, 0x09, [payload])
+        self.send_command('w', 0x06, 0x09, [payload])
         
     def get_hardware_status(self):
         """
@@ -1242,7 +4984,7 @@ class DMD():
         None.
 
         """
-        self.usb_command('r', 0xff, 0x1A, 0x0A, [])
+        self.send_command('r', 0x1A, 0x0A, [])
         self.read_reply()
     
     def get_system_status(self):
@@ -1257,7 +4999,7 @@ class DMD():
         None.
 
         """
-        self.usb_command('r', 0xff, 0x1A, 0x0B, [])
+        self.send_command('r', 0x1A, 0x0B, [])
         self.read_reply()
     
     def get_main_status(self):
@@ -1272,11 +5014,347 @@ class DMD():
         None.
 
         """
-        self.usb_command('r', 0xff, 0x1A, 0x0C, [])
+        self.send_command('r', 0x1A, 0x0C, [])
         self.read_reply()
         
     
         
+# priorities of the commands of a DMDExecutor, lower ones are sent first
+URGENT = 0
+NORMAL = 1
+
+# commands that stop the light, they jump ahead of everything queued
+_URGENT_COMMANDS = ('stop_sequence', 'pause_sequence', 'dmd_park', 'stand_by',
+                    'idle_on')
+
+
+class DMDExecutor():
+    """
+    Sends the commands of a DMD from a worker thread, which owns the usb
+    device.
+
+    The commands are queued by priority and the callers get a future of
+    their result. Uploads (load_bmp_steps() and other methods returning a
+    generator) are sent one chunk at a time, so an urgent command such as
+    stop_sequence(), dmd_park() or switching the LED off is sent after the
+    chunk on the way, not after the whole frame.
+
+    Attributes
+    ----------
+    dmd : DMD
+        The controler. Do not use it directly while the executor runs.
+
+    Methods
+    -------
+    submit()
+        Queues a command and returns a future of its result.
+    load_bmp()
+        Queues the upload of an encoded image.
+    upload_frame()
+        Queues set_bmp() and the upload of an encoded image.
+    shutdown()
+        Sends the queued commands and stops the worker thread.
+    """
+
+    def __init__(self, dmd=None):
+        """
+        DMDExecutor class constructor.
+
+        Parameters
+        ----------
+        dmd : DMD, optional
+            The controler. If None, a DMD is connected. The default is
+            None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.dmd = DMD() if dmd is None else dmd
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, daemon=True,
+                                        name='DMDExecutor')
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.shutdown()
+
+    def submit(self, method, *args, priority=None, **kwargs):
+        """
+        Queues a command.
+
+        Parameters
+        ----------
+        method : str or function
+            Name of the DMD method to call, or a function called on the
+            worker thread.
+        *args, **kwargs
+            Arguments of the method.
+        priority : int, optional
+            URGENT or NORMAL. If None, commands that stop the light
+            (stop_sequence(), pause_sequence(), dmd_park(), stand_by(),
+            idle_on() and an LED PWM of 0) are URGENT and the others
+            NORMAL. The default is None.
+
+        Raises
+        ------
+        RuntimeError
+            If the executor is shut down.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future of the result of the method.
+
+        """
+        if priority is None:
+            urgent = (method in _URGENT_COMMANDS
+                      or (method in ('set_led_pwm', 'set_led_driver_current')
+                          and args and args[0] == 0)
+                      or (method == 'enable_disable_blue_led'
+                          and args and args[0] == 'disable'))
+            priority = URGENT if urgent else NORMAL
+
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The DMDExecutor is shut down.')
+            if not callable(method):
+                method = getattr(self.dmd, method)
+            self._queue.put((priority, next(self._order),
+                             (future, method, args, kwargs)))
+
+        return future
+
+    def load_bmp(self, image, size, debug=False, priority=NORMAL):
+        """
+        Queues the upload of an encoded image, see DMD.load_bmp().
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future that is done when the image is uploaded.
+
+        """
+        return self.submit('load_bmp_steps', image, size, debug,
+                           priority=priority)
+
+    def upload_frame(self, image, index=0, priority=NORMAL):
+        """
+        Queues set_bmp() and the upload of an encoded image, as one command
+        that no other normal command is sent in between.
+
+        Parameters
+        ----------
+        image : bytes-like, numpy array or list
+            The encoded image, as for DMD.load_bmp().
+        index : int, optional
+            Index of the frame in the pattern memory. The default is 0.
+        priority : int, optional
+            URGENT or NORMAL. The default is NORMAL.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future that is done when the image is uploaded.
+
+        """
+        return self.submit('upload_frame_steps', image, index,
+                           priority=priority)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the executor once the commands queued so far are sent.
+
+        Parameters
+        ----------
+        wait : boolean, optional
+            Wait for the worker thread to finish. The default is True.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                # queued behind every command, whatever its priority
+                self._queue.put((NORMAL + 1, next(self._order), None))
+
+        if wait:
+            self._thread.join()
+
+    def _work(self):
+        """
+        Worker thread: sends the commands in the order of their priority.
+        """
+        while True:
+            priority, order, task = self._queue.get()
+            if task is None:
+                return
+
+            future, work, args, kwargs = task
+            try:
+                if not isinstance(work, types.GeneratorType):
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    work = work(*args, **kwargs)
+                    if not isinstance(work, types.GeneratorType):
+                        future.set_result(work)
+                        continue
+
+                # one step of an upload, then the queue is looked at again;
+                # the step keeps its place among the commands of its
+                # priority
+                next(work)
+                self._queue.put((priority, order, (future, work, (), {})))
+            except StopIteration as stop:
+                future.set_result(stop.value)
+            except BaseException as error:
+                future.set_exception(error)
+
+
+class AsyncDMD():
+    """
+    Asyncio interface of a DMD.
+
+    The commands are sent by a DMDExecutor on its worker thread and awaited
+    without blocking the event loop, so other devices can be served during
+    a long upload. Every DMD method can be awaited under its own name, e.g.
+    await dmd.start_sequence() or await dmd.define_pattern(...), and the
+    usb access stays serialised by the executor.
+
+    Attributes
+    ----------
+    executor : DMDExecutor
+        The executor sending the commands.
+
+    Methods
+    -------
+    call()
+        Sends a DMD command and returns its result.
+    load_bmp()
+        Uploads an encoded image.
+    upload_frame()
+        Sends set_bmp() and uploads an encoded image.
+    close()
+        Sends the queued commands and stops the executor.
+    """
+
+    def __init__(self, dmd=None, executor=None):
+        """
+        AsyncDMD class constructor.
+
+        Parameters
+        ----------
+        dmd : DMD, optional
+            The controler. If None, a DMD is connected. The default is
+            None.
+        executor : DMDExecutor, optional
+            Executor to send the commands with, it is created for the dmd
+            if None. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.executor = DMDExecutor(dmd) if executor is None else executor
+
+    def __getattr__(self, name):
+        # every public DMD method is a coroutine function of its own name
+        if name.startswith('_') or not callable(getattr(DMD, name, None)):
+            raise AttributeError(name)
+
+        async def command(*args, **kwargs):
+            return await self.call(name, *args, **kwargs)
+
+        command.__name__ = name
+        command.__doc__ = getattr(DMD, name).__doc__
+
+        return command
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exception):
+        await self.close()
+
+    async def call(self, method, *args, priority=None, **kwargs):
+        """
+        Sends a DMD command and returns its result.
+
+        Parameters
+        ----------
+        method : str
+            Name of the DMD method to call.
+        *args, **kwargs
+            Arguments of the method.
+        priority : int, optional
+            URGENT or NORMAL, as for DMDExecutor.submit(). The default is
+            None.
+
+        Returns
+        -------
+        result
+            The result of the method.
+
+        """
+        return await asyncio.wrap_future(
+            self.executor.submit(method, *args, priority=priority, **kwargs))
+
+    async def load_bmp(self, image, size, debug=False):
+        """
+        Uploads an encoded image, see DMD.load_bmp(). Urgent commands are
+        sent in between its chunks.
+
+        Returns
+        -------
+        None.
+
+        """
+        await asyncio.wrap_future(self.executor.load_bmp(image, size, debug))
+
+    async def upload_frame(self, image, index=0):
+        """
+        Sends set_bmp() and uploads an encoded image, see
+        DMDExecutor.upload_frame().
+
+        Parameters
+        ----------
+        image : bytes-like, numpy array or list
+            The encoded image, as for DMD.load_bmp().
+        index : int, optional
+            Index of the frame in the pattern memory. The default is 0.
+
+        Returns
+        -------
+        None.
+
+        """
+        await asyncio.wrap_future(self.executor.upload_frame(image, index))
+
+    async def close(self):
+        """
+        Sends the queued commands and stops the executor.
+
+        Returns
+        -------
+        None.
+
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.executor.shutdown)
+
+
 class PycrafterGUI():
     """
     Pycrafter GUI class.
@@ -1307,7 +5385,7 @@ class PycrafterGUI():
     encode_matlab()
         Starts the MATLAB encoding program.
     encode_python()
-        Encodes images using the pycrafter encoding function. (slow)
+        Encodes images using the pycrafter encoding function.
     start_image_sequence()
         Start image sequence.
     """
@@ -1346,6 +5424,44 @@ class PycrafterGUI():
         self.image_trigger_out = []
         self.encoded = []
         self.sequence_data = []
+        self.sequence_file = None
+        
+        # number of processes used for encoding, None uses all CPUs
+        self.encoding_processes = None
+        
+        # compression of the encoded images, 'erle' as the MATLAB encoder;
+        # 'auto' picks the smallest one for every image
+        self.encoding_compression = 'erle'
+        
+        # pack the images by their bit depth into shared frames (three 8 bit
+        # images, 24 binary ones, ...) and upload each frame only once,
+        # instead of uploading a frame for every image. The frames are
+        # encoded again from the images, the loaded encodings (e.g. from
+        # MATLAB) are not used, so it is off by default
+        self.pack_frames = False
+        
+        # 'host' shows the images one by one timed by the computer,
+        # 'hardware' uploads them once and lets the controller time the
+        # whole sequence (needs pack_frames)
+        self.sequence_timing = 'host'
+        
+        # without pack_frames, upload the next image to a second slot while
+        # the current one is shown, instead of after it
+        self.pipelined_upload = False
+        
+        # times the exposures and dark times of the images shown one by
+        # one, sleeping and spinning for the last part of every wait,
+        # calibrated from the recent oversleep of the sleeps
+        self.frame_timer = FrameTimer()
+        
+        # preflight: decode every encoded image and compare it with its
+        # image, next to the encoding of the other images
+        self.verify_encoding = False
+        
+        # set to an EncodingCache (folder and size limit of your choice) to
+        # keep encoded images on disk, so that unchanged images do not have
+        # to be encoded again; None encodes every time
+        self.encoding_cache = None
         
         # gui darkmode style colour
         self.bg_cl = 'gray20'
@@ -1823,50 +5939,47 @@ class PycrafterGUI():
             plt.colorbar()
             plt.show()
 
-        # check if we have the encoded_images.txt, because it is not necessary
-        # to be in the folder right away.
+        # check if we have the encoded_images.seq or encoded_images.txt,
+        # because it is not necessary to be in the folder right away.
         files = os.listdir(self.sequence_folder_name)
-        if 'encoded_images.txt' in files:
+        if ('encoded_images.seq' in files or
+                'encoded_images.txt' in files):
             self.is_encoded = True
             self.write_message('report','Encoding was found.')
         else:
             self.is_encoded = False
             message_string = ('No encoding was found. You have to encode' + 
-                              ' images using MATLAB or Python.' + 
-                              ' MATLAB method is faster.')
+                              ' images using MATLAB or Python.')
             self.write_message('report',message_string)
             
         # if the encoded data exists, we load them in a seperate array
         if self.is_encoded == True:
             
-            # read in all lines
-            file_name = self.sequence_folder_name + '/encoded_images.txt'
-            file = open(file_name, 'r')
-            encoded_raw = file.readlines()
-            file.close()
+            # release a previously mapped sequence file
+            if self.sequence_file is not None:
+                self.sequence_file.close()
+                self.sequence_file = None
+            
+            # use the binary sequence file written by the python encoding,
+            # unless the MATLAB encoding in the text file is more recent
+            sequence_file_name = (self.sequence_folder_name +
+                                  '/encoded_images.seq')
+            text_file_name = self.sequence_folder_name + '/encoded_images.txt'
+            if ('encoded_images.seq' in files and
+                    ('encoded_images.txt' not in files or
+                     os.path.getmtime(sequence_file_name) >=
+                     os.path.getmtime(text_file_name))):
+                self.sequence_file = SequenceFile(sequence_file_name)
+                names = self.sequence_file.names()
+                frames = self.sequence_file.frames
+            else:
+                names, frames = read_encoded_text(text_file_name)
+            
+            # names and encoded data alternate in the encoded list
             encoded = []
-        
-            # iterate over each line, split up & filter elements
-            for index in range(1, len(encoded_raw), 1):
-                # even numbered elements is encoded data
-                if index % 2 == 0:
-                    enc_raw_splitted = encoded_raw[index].split(',')
-                    enc_raw_filtered = []
-                    
-                    # filer -> only append elements that fit the condition
-                    for element in enc_raw_splitted:
-                        if not element == '' and \
-                            not element == '\n' and \
-                             not element == ' \n' and \
-                              not element == ' ':
-                                  enc_raw_filtered.append(element)
-                            
-                    encoded.append(list(map(int,enc_raw_filtered)))
-                    
-                # uneven numbered elements (image names)
-                else:
-                    image_name = encoded_raw[index].split(',')[0]
-                    encoded.append(image_name)
+            for image_name, frame in zip(names, frames):
+                encoded.append(image_name)
+                encoded.append(frame)
                     
             # check here, that the number of encoded entries is double the 
             # number of images. It has to be double, since encodin data 
@@ -1966,7 +6079,7 @@ class PycrafterGUI():
         
     def encode_python(self):
         """
-        Encodes images using the pycrafter encoding function. (slow)
+        Encodes images using the pycrafter encoding function.
 
         Returns
         -------
@@ -1976,11 +6089,10 @@ class PycrafterGUI():
         # clear existing encoded data
         self.encoded = []
         
-        # write data in "encoded_images.txt" and overwrite everything
-        file_name = self.sequence_folder_name + '/encoded_images.txt'
-        file = open(file_name,'w')
-        file.write('First Line will be ignored\n')
-        file.close()
+        # the data is written in "encoded_images.seq", which overwrites
+        # everything; use export_encoded_text() to get an
+        # "encoded_images.txt" for the MATLAB tools
+        file_name = self.sequence_folder_name + '/encoded_images.seq'
         
         message_string = ('Start Python Encodig, please wait a moment.')
         self.write_message('action', message_string)
@@ -1988,16 +6100,24 @@ class PycrafterGUI():
         # get already saved images
         # call pycrafter encoding method for each image and save them in the
         # image sequence data array --> overwrite if existing
-        for index, image_data in enumerate(self.sequence_data):
-            
-            # merge the image here
-            image_data_merged = merge_images(image_data[8])
+        # the images are merged & encoded on a process pool and come back in
+        # the order of the sequence
+        # the greyscale images are shown as 8 bit patterns, their bits are
+        # the bit planes 0 to 7 of the frame
+        frames = [split_bit_planes(image_data[8])
+                  for image_data in self.sequence_data]
+        encoding = encode_frames(frames, self.encoding_processes,
+                                 self.encoding_cache,
+                                 self.encoding_compression,
+                                 check=self.verify_encoding)
+        
+        for index, (encoded_image, encoded_size) in enumerate(encoding):
             
-            # encode image here
-            encoded_image, encoded_size = encode(image_data_merged)
             self.encoded.append(encoded_image)
             
-            message_string = ('Encode image %d.'%(index))
+            message_string = ('Encode image %d (%s, %d bytes).'
+                              %(index, encoded_compression(encoded_image),
+                                encoded_size))
             self.write_message('action',message_string)
     
             # append data in sequence data
@@ -2006,20 +6126,18 @@ class PycrafterGUI():
             elif len(self.sequence_data[index]) == 9:
                 self.sequence_data[index].append(encoded_image)
             
-            # save all encoding in the encoded images file
-            file = open(file_name,'a')
-            # write the image name
-            file.write(self.sequence_data[index][0])
-            file.write(',')
-            file.write('\n')
-            # write encoding data
-            for encoded_data in encoded_image:
-                file.write(str(encoded_data) + ', ')
-            file.write('\n')
-            file.close()
-            
             self.update_progressbar(index, len(self.sequence_data))
             
+        # the old frames are all replaced, release the mapped file so that
+        # it can be overwritten
+        if self.sequence_file is not None:
+            self.sequence_file.close()
+            self.sequence_file = None
+            
+        # save all encoding in the encoded images file
+        parameters = [image_data[:8] for image_data in self.sequence_data]
+        write_sequence_file(file_name, self.encoded, parameters)
+            
         self.is_encoded = True
         self.write_message('report','Finished encoding with Python.')
         
@@ -2064,6 +6182,73 @@ class PycrafterGUI():
 
             self.write_message('action', ('Start imaging process'+
                                           ' of %d images' %(len(encoded))))
+            
+            if self.pack_frames:
+                # an image of bit depth n shows the n most significant bits
+                # of its greyscale values; images shown more than once are
+                # packed only once
+                patterns = [numpy.asarray(image_data, dtype=numpy.uint8)
+                            >> (8 - bit_depth)
+                            for image_data, bit_depth in zip(image,
+                                                             bit_depths)]
+                first, image_index = deduplicate_images(patterns, bit_depths)
+                frames, positions = pack_patterns(
+                    [patterns[j] for j in first],
+                    [bit_depths[j] for j in first])
+                positions = [positions[k] for k in image_index]
+                
+                # the frames come from the encoding cache when the images
+                # were shown before
+                encoding = encode_frames(frames, self.encoding_processes,
+                                         self.encoding_cache,
+                                         self.encoding_compression,
+                                         merge_patterns,
+                                         check=self.verify_encoding)
+                frames = [frame for frame, size in encoding]
+                
+                # the upload time goes with the number of bytes, compare
+                # with uploading the encoded image of every image
+                packed_size = sum(len(frame) for frame in frames)
+                single_size = sum(len(enc) for enc in encoded)
+                message_string = ('Upload %d frames for %d images '
+                                  '(%d distinct): %d bytes instead of %d, '
+                                  '%.1f times faster, %d bytes less '
+                                  'controller memory.'
+                                  %(len(frames), len(encoded), len(first),
+                                    packed_size, single_size,
+                                    single_size / max(packed_size, 1),
+                                    single_size - packed_size))
+                self.write_message('action', message_string)
+            else:
+                frames = encoded
+                positions = [(index, None) for index in range(len(encoded))]
+                
+            hardware_timing = (self.pack_frames
+                               and self.sequence_timing == 'hardware')
+            if (hardware_timing and any(trigger_ins)
+                    and len(brightness_segments(brightness)) > 1):
+                # the host can not see when a triggered segment ends
+                message_string = ('Input triggers with several brightness '
+                                  'segments, the sequence is timed by the '
+                                  'host.')
+                self.write_message('action', message_string)
+                hardware_timing = False
+
+            if hardware_timing:
+                # one look up table per brightness, the controller steps
+                # through the images with their own exposure and dark time
+                message_string = ('Show the sequence timed by the '
+                                  'controller in %d brightness segments.'
+                                  %(len(brightness_segments(brightness))))
+                self.write_message('action', message_string)
+                
+                self.dlp.run_sequence(frames, brightness, exposures,
+                                      dark_times, trigger_ins, trigger_outs,
+                                      positions, bit_depths)
+                
+                message_string = ('Finished to display Image Sequence.')
+                self.write_message('report', message_string)
+                return
 
             # stop any already existing sequence
             self.dlp.stop_sequence()
@@ -2071,18 +6256,31 @@ class PycrafterGUI():
             self.dlp.idle_off()
             self.dlp.change_mode(3)
             
-            for index, enc in enumerate(encoded):
-                for j in range(0,2,1):
-                    self.dlp.define_pattern(index, exposures[index],
-                                            bit_depths[index],'100',
-                                            trigger_ins[index],
-                                            dark_times[index],
-                                            trigger_outs[index], j, j)
+            # chunks of the next image uploaded during the exposure
+            upload = None
+            
+            self.frame_timer.reset()
+            
+            if not self.pack_frames and self.pipelined_upload:
+                upload = self.dlp.upload_frame_steps(encoded[0], 0)
+            elif not self.pack_frames:
+                for index, enc in enumerate(encoded):
+                    for j in range(0,2,1):
+                        self.dlp.define_pattern(index, exposures[index],
+                                                bit_depths[index],'100',
+                                                trigger_ins[index],
+                                                dark_times[index],
+                                                trigger_outs[index], j, j)
+            else:
+                # upload every frame once, the images point at their frame
+                # and bits
+                for frame in reversed(range(len(frames))):
+                    self.dlp.set_bmp(frame, len(frames[frame]))
+                    self.dlp.load_bmp(frames[frame], len(frames[frame]))
 
-            for index, enc in enumerate(encoded):
+            for index, (frame, bit_pos) in enumerate(positions):
                 
-                display_time = 0
-                wait_time = 0
+                enc = frames[frame]
                 
                 message_string = ('Image #%d with parameters; :'%(index) +
                                   'index: %d; ' %(index) +
@@ -2096,17 +6294,47 @@ class PycrafterGUI():
 
                 self.dlp.stop_sequence()
 
-                # Here we configure the look up table of the DMD
-                # We say, how many images we have and that every image is
-                # repeated just once
-                self.dlp.configure_lut(len(encoded), 1)
-                
-                # Tell the DMD the sub index of the image, and how many
-                # bytes it has
-                self.dlp.set_bmp(0, len(enc))
-                
-                # Here we upload the encoded image
-                self.dlp.load_bmp(enc, len(enc))
+                if bit_pos is None and self.pipelined_upload:
+                    # the image is (almost) uploaded to its slot already,
+                    # only the look up table is switched to it
+                    if upload is not None:
+                        for chunk_index in upload:
+                            pass
+                    
+                    self.dlp.define_pattern(0, exposures[index],
+                                            bit_depths[index], '100',
+                                            trigger_ins[index],
+                                            dark_times[index],
+                                            trigger_outs[index], index % 2,
+                                            0)
+                    self.dlp.configure_lut(1, 1)
+                    
+                    upload = None
+                    if index + 1 < len(encoded):
+                        upload = self.dlp.upload_frame_steps(
+                            encoded[index + 1], (index + 1) % 2)
+                elif bit_pos is None:
+                    # Here we configure the look up table of the DMD
+                    # We say, how many images we have and that every image
+                    # is repeated just once
+                    self.dlp.configure_lut(len(encoded), 1)
+                    
+                    # Tell the DMD the sub index of the image, and how many
+                    # bytes it has
+                    self.dlp.set_bmp(0, len(enc))
+                    
+                    # Here we upload the encoded image
+                    self.dlp.load_bmp(enc, len(enc))
+                else:
+                    # the frame is uploaded already, the pattern shows the
+                    # bits of this image in it
+                    self.dlp.define_pattern(0, exposures[index],
+                                            bit_depths[index], '100',
+                                            trigger_ins[index],
+                                            dark_times[index],
+                                            trigger_outs[index], frame,
+                                            bit_pos)
+                    self.dlp.configure_lut(1, 1)
                 
                 # Set the LED Brightness to the specific value
                 self.dlp.set_led_pwm(brightness[index])
@@ -2114,24 +6342,19 @@ class PycrafterGUI():
                 # start to display the image
                 self.dlp.start_sequence()
                 
-                # start the time clock
-                st = time.clock();
-                
-                # wait until the exposure time is over
-                while display_time <= exposures[index]:
-                    display_time = (time.clock()-st)*1e6
+                # wait until the exposure time is over, sending the chunks
+                # of the next image meanwhile
+                display_time, upload = self.frame_timer.wait(
+                    exposures[index], work=upload, index=index,
+                    kind='exposure')
     
                 # turn off the led & stop the sequence
                 self.dlp.set_led_pwm(0)
                 self.dlp.stop_sequence()
                 
-                # get the new start time for the dark times to come
-                st = time.clock();
-                
                 # wait until the dark time is over
-                if dark_times[index] > 0:
-                    while wait_time <= dark_times[index]:
-                        wait_time = (time.clock()-st)*1e6
+                wait_time, upload = self.frame_timer.wait(
+                    dark_times[index], work=upload, index=index, kind='dark')
 
                 if debug:
                     print("\n- DISPLAY IMAGE -")
@@ -2148,11 +6371,22 @@ class PycrafterGUI():
             
             self.dlp.set_led_pwm(0)
             self.dlp.stop_sequence()
+            
+            exposure = self.frame_timer.statistics('exposure')
+            dark = self.frame_timer.statistics('dark')
+            message_string = ('Timing jitter [us]: exposure mean %.1f, '
+                              'max %.1f; dark time mean %.1f, max %.1f.'
+                              %(exposure['mean'], exposure['max'],
+                                dark['mean'], dark['max']))
+            self.write_message('action', message_string)
 
             message_string = ('Finished to display Image Sequence.')
             self.write_message('report', message_string)
         
         
-GUI = PycrafterGUI()
-sq = GUI.sequence_data
-enc = GUI.encoded
\ No newline at end of file
+if __name__ == '__main__':
+    # only start the GUI when run as a script, worker processes of the
+    # encoding pool import this module as well
+    GUI = PycrafterGUI()
+    sq = GUI.sequence_data
+    enc = GUI.encoded
@@ -0,0 +1,235 @@
+"""
+Compares the images encoded by pycrafter6500.encode() byte for byte with
+reference encoders written pixel by pixel: the enhanced run length encoder
+the module had before it was vectorized, and straight loops over the plain
+run length and the uncompressed format.
+
+Run with pytest. The module needs pyusb, tkinter and matplotlib to import,
+no DMD has to be connected.
+"""
+import numpy
+import pytest
+
+pytest.importorskip('usb')
+pytest.importorskip('tkinter')
+pytest.importorskip('matplotlib')
+
+import pycrafter6500
+from pycrafter6500 import bits_to_bytes, convert_num_to_bit_string
+
+
+def reference_header(width, height, compression):
+    """
+    Returns the 48 header bytes of an encoded image, the total size is
+    filled in by reference_frame().
+    """
+    header = [0x53, 0x70, 0x6c, 0x64]
+    header += bits_to_bytes(convert_num_to_bit_string(width, 16))
+    header += bits_to_bytes(convert_num_to_bit_string(height, 16))
+    header += [0x00] * 4
+    header += [0xff] * 8
+    header += [0x00] * 4
+    header += [0x00, pycrafter6500.COMPRESSIONS[compression], 0x01]
+    header += [0x00] * 21
+
+    return header
+
+
+def reference_frame(body, width, height, compression, end):
+    """
+    Returns the encoded image around the encoded rows, padded to a
+    multiple of 4 bytes with the total size in the header.
+    """
+    bit_string = reference_header(width, height, compression) + body + end
+    bit_string += [0x00] * (-len(bit_string) % 4)
+    bit_string[8:12] = bits_to_bytes(convert_num_to_bit_string(
+        len(bit_string), 32))
+
+    return bit_string
+
+
+def pixels(image):
+    """
+    Returns the image as rows of pixel tuples.
+    """
+    return [[tuple(int(value) for value in pixel) for pixel in row]
+            for row in image]
+
+
+def reference_erle(image):
+    """
+    Enhanced run length encoding, the pixel loop of encode() before it was
+    vectorized, with the image size taken from the image. As before, the
+    first row checks its literal spans against the last row. The former
+    encoder never ended on a literal span of the first row starting on a
+    pixel equal to the one of the last row, the images of the tests avoid
+    it.
+    """
+    height, width = image.shape[:2]
+    image = pixels(image)
+    body = []
+
+    def length(n):
+        if n >= 128:
+            return [(n & 0x7f) | 0x80, n >> 7]
+        return [n]
+
+    for i in range(height):
+        j = 0
+        while j < width:
+            n = 0
+            if i > 0 and image[i][j] == image[i - 1][j]:
+                while j < width and image[i][j] == image[i - 1][j]:
+                    n += 1
+                    j += 1
+                body += [0x00, 0x01] + length(n)
+            elif j < width - 1 and image[i][j] == image[i][j + 1]:
+                n += 1
+                while j < width - 1 and image[i][j] == image[i][j + 1]:
+                    n += 1
+                    j += 1
+                body += length(n) + list(image[i][j - 1])
+                j += 1
+            elif (j > width - 3 or image[i][j + 1] == image[i][j + 2]
+                  or image[i][j + 1] == image[i - 1][j + 1]):
+                body += [0x01] + list(image[i][j])
+                j += 1
+            else:
+                literal = []
+                while (image[i][j] != image[i][j + 1]
+                       and image[i][j] != image[i - 1][j]
+                       and j < width - 1):
+                    n += 1
+                    literal += list(image[i][j])
+                    j += 1
+                assert n > 0, 'the former encoder loops on row %d' % i
+                body += [0x00] + length(n) + literal
+        body += [0x00, 0x00]
+
+    return reference_frame(body, width, height, 'erle', [0x00, 0x01, 0x00])
+
+
+def reference_rle(image):
+    """
+    Plain run length encoding: runs of two or more equal pixels are repeat
+    commands, single pixels next to each other literal commands, both of
+    up to 255 pixels. A single pixel left over is a repeat of one.
+    """
+    height, width = image.shape[:2]
+    body = []
+    for row in pixels(image):
+        runs = []
+        j = 0
+        while j < width:
+            k = j
+            while k < width and row[k] == row[j]:
+                k += 1
+            runs.append((j, k - j))
+            j = k
+
+        r = 0
+        while r < len(runs):
+            start, n = runs[r]
+            if n > 1:
+                while n > 0:
+                    body += [min(n, 255)] + list(row[start])
+                    n -= min(n, 255)
+                r += 1
+                continue
+
+            singles = []
+            while r < len(runs) and runs[r][1] == 1:
+                singles.append(row[runs[r][0]])
+                r += 1
+            for chunk in range(0, len(singles), 255):
+                group = singles[chunk:chunk + 255]
+                if len(group) == 1:
+                    body += [0x01] + list(group[0])
+                else:
+                    body += [0x00, len(group)]
+                    for pixel in group:
+                        body += list(pixel)
+        body += [0x00, 0x00]
+
+    return reference_frame(body, width, height, 'rle', [0x00, 0x01])
+
+
+def reference_uncompressed(image):
+    """
+    Uncompressed image, the pixels row by row.
+    """
+    height, width = image.shape[:2]
+    body = [value for row in pixels(image) for pixel in row
+            for value in pixel]
+
+    return reference_frame(body, width, height, 'uncompressed', [])
+
+
+REFERENCES = {'erle': reference_erle, 'rle': reference_rle,
+              'uncompressed': reference_uncompressed}
+
+
+def fixed_images():
+    """
+    Returns small images covering the commands of the encoders: copies
+    from the row above, repeats shorter and longer than 128 and 255
+    pixels, single pixels and literal spans.
+    """
+    images = {}
+
+    images['blank'] = numpy.zeros((4, 300, 3), dtype=numpy.uint8)
+
+    grating = numpy.zeros((6, 300, 3), dtype=numpy.uint8)
+    grating[:, (numpy.arange(300) // 7) % 2 == 1] = 255
+    images['grating'] = grating
+
+    steps = numpy.zeros((5, 400, 3), dtype=numpy.uint8)
+    steps[:, 130:] = (1, 2, 3)
+    steps[:, 390:] = (9, 9, 9)
+    steps[2] = steps[1]
+    steps[3, 200:] = 7
+    images['steps'] = steps
+
+    # literal spans end on a pixel repeated next to it or copied from
+    # above, the rows end with two equal pixels
+    literals = numpy.zeros((4, 300, 3), dtype=numpy.uint8)
+    literals[:, :, 0] = numpy.arange(300) % 251
+    literals[:, :, 1] = numpy.arange(300) // 251
+    literals[:, :, 2] = numpy.arange(4)[:, numpy.newaxis]
+    literals[:, -2:] = (5, 5, 5)
+    literals[2, 100:] = literals[1, 100:]
+    literals[3, 50:60] = 200
+    images['literals'] = literals
+
+    singles = numpy.zeros((3, 20, 3), dtype=numpy.uint8)
+    singles[:, ::2, 2] = 1
+    singles[:, -2:] = 3
+    singles[1, 4:8] = (4, 5, 6)
+    singles[2, :, 0] = 10
+    images['singles'] = singles
+
+    return images
+
+
+@pytest.mark.parametrize('compression', ['erle', 'rle', 'uncompressed'])
+@pytest.mark.parametrize('name', sorted(fixed_images()))
+def test_encode(name, compression):
+    image = fixed_images()[name]
+    bit_string, byte_count = pycrafter6500.encode(image, compression)
+    expected = REFERENCES[compression](image)
+    assert list(bit_string) == expected
+    assert byte_count == len(expected)
+
+
+def test_encode_merged_frame():
+    # a full frame of bit planes, as sent to the controller
+    planes = [numpy.zeros((1080, 1920), dtype=numpy.uint8)
+              for bit in range(24)]
+    planes[0][:, 960:] = 1
+    planes[5][::3] = 1
+    planes[12][400:700, 300:1700:2] = 1
+    planes[23][:, (numpy.arange(1920) // 11) % 2 == 1] = 1
+    image = pycrafter6500.merge_images(planes)
+
+    bit_string, byte_count = pycrafter6500.encode(image)
+    assert list(bit_string) == reference_erle(image)
@@ -0,0 +1,279 @@
+"""
+Compares the usb commands of pycrafter6500 byte for byte with the bit string
+builders they replaced.
+
+Run with pytest. The module needs pyusb, tkinter and matplotlib to import,
+no DMD has to be connected.
+"""
+import itertools
+
+import pytest
+
+pytest.importorskip('usb')
+pytest.importorskip('tkinter')
+pytest.importorskip('matplotlib')
+
+import pycrafter6500
+from pycrafter6500 import bits_to_bytes, convert_num_to_bit_string
+
+
+def old_reports(mode, byte_sequence, com1, com2, data):
+    """
+    Returns the 64 byte reports of a usb command as the bit string version
+    of DMD.usb_command() wrote them.
+    """
+    buffer = []
+    flag = ('1' if mode == 'r' else '0') + '1000000'
+    buffer.append(bits_to_bytes(flag)[0])
+    buffer.append(byte_sequence)
+    length = bits_to_bytes(convert_num_to_bit_string(len(data) + 2, 16))
+    buffer += [length[0], length[1], com2, com1]
+
+    if len(buffer) + len(data) < 65:
+        buffer += list(data)
+        buffer += [0x00] * (64 - len(buffer))
+        return [bytes(buffer)]
+
+    reports = [bytes(buffer + list(data[:58]))]
+    rest = list(data[58:])
+    rest += [0x00] * (-len(rest) % 64)
+    for i in range(0, len(rest), 64):
+        reports.append(bytes(rest[i:i + 64]))
+
+    return reports
+
+
+def old_pattern_payload(index, exposure, bit_depth, color, trigger_in,
+                        dark_time, trigger_out, pat_ind, bit_pos):
+    """
+    Returns the payload of the bit string version of DMD.define_pattern().
+    """
+    payload = []
+    payload += bits_to_bytes(convert_num_to_bit_string(index, 16))
+    payload += bits_to_bytes(convert_num_to_bit_string(exposure, 24))
+    options_byte = (color + convert_num_to_bit_string(bit_depth - 1, 3)
+                    + '1')
+    options_byte = ('1' if trigger_in else '0') + options_byte
+    payload.append(bits_to_bytes(options_byte)[0])
+    payload += bits_to_bytes(convert_num_to_bit_string(dark_time, 24))
+    payload.append(bits_to_bytes(convert_num_to_bit_string(trigger_out,
+                                                           8))[0])
+    payload += bits_to_bytes(convert_num_to_bit_string(bit_pos, 5)
+                             + convert_num_to_bit_string(pat_ind, 11))
+
+    return payload
+
+
+def old_lut_payload(image_number, repetition_number):
+    """
+    Returns the payload of the bit string version of DMD.configure_lut().
+    """
+    return bits_to_bytes(convert_num_to_bit_string(repetition_number, 32)
+                         + '00000'
+                         + convert_num_to_bit_string(image_number, 11))
+
+
+def old_bmp_index_payload(index, size):
+    """
+    Returns the payload of the bit string version of DMD.set_bmp().
+    """
+    return (bits_to_bytes('0' * 11 + convert_num_to_bit_string(index, 5))
+            + bits_to_bytes(convert_num_to_bit_string(size, 32)))
+
+
+def old_load_bmp_payloads(image):
+    """
+    Returns the chunk payloads of the bit string version of DMD.load_bmp().
+    """
+    size = len(image)
+    pack_num = int(size / 504 + 1)
+    payloads = []
+    for i in range(pack_num):
+        leng = 504 if i < pack_num - 1 else size % 504
+        payloads.append(bits_to_bytes(convert_num_to_bit_string(leng, 16))
+                        + list(image[i * 504:i * 504 + leng]))
+
+    return payloads
+
+
+class FakeDevice():
+    """
+    Records the reports written to it and answers every read with the
+    sequence byte of the last command.
+    """
+
+    def __init__(self):
+        self.reports = []
+        self.sequence = 0
+
+    def set_configuration(self):
+        pass
+
+    def write(self, endpoint, data, timeout=None):
+        data = bytes(data)
+        assert len(data) % 64 == 0
+        # every command of these tests fits in one write
+        self.sequence = data[1]
+        for i in range(0, len(data), 64):
+            self.reports.append(data[i:i + 64])
+        return len(data)
+
+    def read(self, endpoint, size, timeout=None):
+        answer = [0] * size
+        answer[1] = self.sequence
+        return answer
+
+
+@pytest.fixture
+def dmd(monkeypatch):
+    monkeypatch.setattr(pycrafter6500.usb.core, 'find',
+                        lambda **kwargs: FakeDevice())
+    dmd = pycrafter6500.DMD()
+    dmd.error_check = 'off'
+    return dmd
+
+
+def assert_commands(reports, commands):
+    """
+    Compares the written reports with the ones of the bit string version.
+    The sequence byte of each command is taken from its first report.
+    """
+    position = 0
+    for mode, com1, com2, data in commands:
+        assert position < len(reports), 'missing command %02x%02x' % (com1,
+                                                                     com2)
+        expected = old_reports(mode, reports[position][1], com1, com2,
+                               list(data))
+        assert reports[position:position + len(expected)] == expected
+        position += len(expected)
+    assert position == len(reports)
+
+
+def test_command_packet():
+    for mode, data in itertools.product(
+            'rw', [[], [7], list(range(58)), list(range(59)),
+                   list(range(122)), list(range(123)),
+                   [i % 256 for i in range(600)]]):
+        packet = pycrafter6500.command_packet(mode, 0x11, 0x1a, 0x2b, data)
+        packet += bytes(-len(packet) % 64)
+        assert packet == b''.join(old_reports(mode, 0x11, 0x1a, 0x2b, data))
+
+
+@pytest.mark.parametrize('bit_depth', [1, 2, 4, 6, 7, 8])
+def test_pattern_payload(bit_depth):
+    for (index, exposure, color, trigger_in, dark_time, trigger_out,
+         pat_ind, bit_pos) in itertools.product(
+             [0, 1, 399], [105, 4046, 2 ** 24 - 1], ['100', '111', '001'],
+             [False, True], [0, 1, 2 ** 24 - 1], [0, 1],
+             [0, 1, 2 ** 11 - 1], [0, 7, 23]):
+        assert list(pycrafter6500.pattern_payload(
+            index, exposure, bit_depth, color, trigger_in, dark_time,
+            trigger_out, pat_ind, bit_pos)) == old_pattern_payload(
+                index, exposure, bit_depth, color, trigger_in, dark_time,
+                trigger_out, pat_ind, bit_pos)
+
+
+def test_lut_payload():
+    for image_number, repetition_number in itertools.product(
+            [0, 1, 24, 400, 2 ** 11 - 1], [0, 1, 255, 256, 2 ** 32 - 1]):
+        assert list(pycrafter6500.lut_payload(
+            image_number, repetition_number)) == old_lut_payload(
+                image_number, repetition_number)
+
+
+def test_bmp_index_payload():
+    for index, size in itertools.product([0, 1, 31], [0, 1, 504, 2 ** 32 - 1]):
+        assert list(pycrafter6500.bmp_index_payload(
+            index, size)) == old_bmp_index_payload(index, size)
+
+
+def test_define_pattern(dmd):
+    dmd.define_pattern(3, 4046, 8, '100', True, 105, 1, 17, 2)
+    assert_commands(dmd.dev.reports, [
+        ('w', 0x1a, 0x34,
+         old_pattern_payload(3, 4046, 8, '100', True, 105, 1, 17, 2))])
+
+
+def test_configure_lut(dmd):
+    dmd.configure_lut(48, 0)
+    assert_commands(dmd.dev.reports,
+                    [('w', 0x1a, 0x31, old_lut_payload(48, 0))])
+
+
+def test_set_bmp(dmd):
+    dmd.set_bmp(5, 123456)
+    assert_commands(dmd.dev.reports,
+                    [('w', 0x1a, 0x2a, old_bmp_index_payload(5, 123456))])
+
+
+@pytest.mark.parametrize('size', [0, 1, 58, 503, 504, 1000, 1008, 504 * 3 + 1])
+def test_load_bmp(dmd, size):
+    image = bytes(i * 7 % 256 for i in range(size))
+    dmd.load_bmp(image, size, debug=False)
+    assert_commands(dmd.dev.reports,
+                    [('w', 0x1a, 0x2b, payload)
+                     for payload in old_load_bmp_payloads(image)])
+
+
+@pytest.mark.parametrize('call, commands', [
+    (lambda dmd: dmd.set_led_pwm(100),
+     [('w', 0x0b, 0x01, [0, 0, 100]), ('w', 0x1a, 0x05, [0]),
+      ('w', 0x1a, 0x07, [4])]),
+    (lambda dmd: dmd.set_led_pwm(255, 'disable', 'invert'),
+     [('w', 0x0b, 0x01, [0, 0, 255]), ('w', 0x1a, 0x05, [0]),
+      ('w', 0x1a, 0x07, [0])]),
+    (lambda dmd: dmd.long_axis_image_flip(), [('w', 0x10, 0x08, [1])]),
+    (lambda dmd: dmd.short_axis_image_flip(), [('w', 0x10, 0x09, [1])]),
+    (lambda dmd: dmd.dmd_park(),
+     [('w', 0x1a, 0x24, [0]), ('w', 0x06, 0x09, [1])]),
+    (lambda dmd: dmd.dmd_unpark(), [('w', 0x06, 0x09, [0])]),
+    (lambda dmd: dmd.idle_on(), [('w', 0x02, 0x01, [1])]),
+    (lambda dmd: dmd.idle_off(), [('w', 0x02, 0x01, [0])]),
+    (lambda dmd: dmd.stand_by(), [('w', 0x02, 0x00, [1])]),
+    (lambda dmd: dmd.wake_up(), [('w', 0x02, 0x00, [0])]),
+    (lambda dmd: dmd.reset(), [('w', 0x02, 0x00, [2])]),
+    (lambda dmd: dmd.test_read(), [('r', 0x11, 0x00, [])]),
+    (lambda dmd: dmd.test_write(),
+     [('w', 0x11, 0x00, [0xff, 0x01, 0xff, 0x01, 0xff, 0x01])]),
+    (lambda dmd: dmd.change_mode(3), [('w', 0x1a, 0x1b, [3])]),
+    (lambda dmd: dmd.start_sequence(), [('w', 0x1a, 0x24, [2])]),
+    (lambda dmd: dmd.pause_sequence(), [('w', 0x1a, 0x24, [1])]),
+    (lambda dmd: dmd.stop_sequence(), [('w', 0x1a, 0x24, [0])]),
+    (lambda dmd: dmd.read_status(), [('r', 0x00, 0x00, [])]),
+    (lambda dmd: dmd.read_firmware(), [('r', 0x02, 0x06, [])]),
+    (lambda dmd: dmd.get_hardware_status(), [('r', 0x1a, 0x0a, [])]),
+    (lambda dmd: dmd.get_system_status(), [('r', 0x1a, 0x0b, [])]),
+    (lambda dmd: dmd.get_main_status(), [('r', 0x1a, 0x0c, [])]),
+])
+def test_fixed_commands(dmd, call, commands):
+    call(dmd)
+    assert_commands(dmd.dev.reports, commands)
+
+
+def test_sequence_bytes(dmd):
+    dmd.reply_writes = False
+    dmd.sequence = 254
+    dmd.stop_sequence()
+    dmd.stop_sequence()
+    dmd.reply_writes = True
+    dmd.sequence = 254
+    dmd.test_read()
+    assert [report[1] for report in dmd.dev.reports] == [254, 255, 0]
+    assert dmd.unanswered == {254: (0x1a, 0x24), 255: (0x1a, 0x24)}
+
+
+def test_usb_command_signature(dmd):
+    # the sequence byte given is replaced by the next one
+    dmd.sequence = 7
+    assert dmd.usb_command('w', 0x00, 0x1a, 0x24, [2]) == 7
+    assert_commands(dmd.dev.reports, [('w', 0x1a, 0x24, [2])])
+
+
+def test_header_table():
+    pycrafter6500._report_headers.clear()
+    for byte_sequence in range(256):
+        header = pycrafter6500.command_header('w', byte_sequence, 0x1a, 0x2b,
+                                              504)
+        assert header == bytes(old_reports('w', byte_sequence, 0x1a, 0x2b,
+                                           [0] * 504)[0][:6])
+    assert len(pycrafter6500._report_headers) == 1